@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+__description__ = \
+"""
+Compare the precomputed gather map used by Display.draw against the original
+per-panel loop for walls of 4, 16 and 64 panels.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+__usage__ = "python display_draw.py [num_frames]"
+
+import sys, timeit
+
+import numpy as np
+import ledsart
+
+def build_display(panels_per_side,panel_size=32,skip_unchanged=True):
+    """
+    Build a square wall of panels with a snaking chain and mixed rotations,
+    drawing to the null backend.
+    """
+
+    layout = [[ledsart.Panel(panel_size,panel_size)
+               for j in range(panels_per_side)]
+              for i in range(panels_per_side)]
+
+    # Snake through the layout, flipping every other row
+    chain = []
+    rotation = []
+    for i, row in enumerate(layout):
+        if i % 2 == 0:
+            chain.extend(row)
+            rotation.extend([0]*len(row))
+        else:
+            chain.extend(row[::-1])
+            rotation.extend([180]*len(row))
+
+    return ledsart.Display(layout,chain,rotation,backend="null",
+                           skip_unchanged=skip_unchanged)
+
+def loop_draw(display,image):
+    """
+    Original Display.draw mapping: slice, rotate and copy each panel.
+    """
+
+    for i, s in enumerate(display._chain):
+
+        chain_x_0 = s.chain_row*display._band_rows
+        chain_x_1 = chain_x_0 + s.chain_shape[0]
+        chain_y_0 = s.chain_offset
+        chain_y_1 = s.chain_offset + s.chain_shape[1]
+
+        image_x_0 = s.offset[0]
+        image_x_1 = s.offset[0] + s.shape[0]
+
+        image_y_0 = s.offset[1]
+        image_y_1 = s.offset[1] + s.shape[1]
+
+        display._chain_matrix[chain_x_0:chain_x_1,
+                              chain_y_0:chain_y_1,:3] = \
+                              s.transform(image[image_x_0:image_x_1,
+                                                image_y_0:image_y_1,:3])
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    try:
+        num_frames = int(argv[0])
+    except IndexError:
+        num_frames = 200
+
+    print("{:>8s} {:>12s} {:>12s} {:>8s}".format("panels","loop (ms)",
+                                                 "gather (ms)","speedup"))
+    for panels_per_side in (2,4,8):
+
+        # Every frame here is the same image, so do not skip unchanged
+        # frames or only the comparison would be timed
+        display = build_display(panels_per_side,skip_unchanged=False)
+        image = np.random.randint(0,256,(display._total_x_size,
+                                         display._total_y_size,4))
+
+        # Make sure both approaches give identical chains
+        loop_draw(display,image)
+        expected = display._chain_matrix[:,:,:3].copy()
+        display.draw(image)
+        if not np.array_equal(expected,display._chain_matrix[:,:,:3]):
+            err = "gather map does not reproduce per-panel loop.\n"
+            raise RuntimeError(err)
+
+        loop_time = timeit.timeit(lambda: loop_draw(display,image),
+                                  number=num_frames)/num_frames
+        gather_time = timeit.timeit(lambda: display.draw(image),
+                                    number=num_frames)/num_frames
+
+        print("{:>8d} {:>12.4f} {:>12.4f} {:>8.2f}".format(panels_per_side**2,
+                                                           loop_time*1000,
+                                                           gather_time*1000,
+                                                           loop_time/gather_time))
+
+if __name__ == "__main__":
+    main()
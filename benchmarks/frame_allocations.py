@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+__description__ = \
+"""
+Measure how much memory is allocated per frame by Display.draw once it has
+reached steady state (and by refreshing the PIL image RgbmatrixBackend hands
+to rgbmatrix), compared to the original int64 chain that was converted with
+np.uint8 and Image.fromarray on every frame.  Allocations are as seen by
+tracemalloc.  Steady-state frames are not zero: a draw allocates about 1.5 KB
+and the image refresh a few hundred bytes of Python and numpy bookkeeping,
+the same whatever the frame size.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+__usage__ = "python frame_allocations.py [num_frames]"
+
+import sys, tracemalloc
+
+import numpy as np
+import ledsart
+from ledsart.display import ChainImage
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+def build_display(panel_size=32):
+    """
+    Four panel display like the one in example/run_art.py.
+    """
+
+    A = ledsart.Panel(panel_size,panel_size)
+    B = ledsart.Panel(panel_size,panel_size)
+    C = ledsart.Panel(panel_size,panel_size)
+    D = ledsart.Panel(panel_size,panel_size)
+
+    return ledsart.Display([[A,B],[C,D]],[A,B,D,C],[0,0,180,180],
+                           backend="null")
+
+def bytes_per_frame(function,num_frames):
+    """
+    Return the largest number of bytes transiently allocated by a single call
+    to function over num_frames calls.
+    """
+
+    tracemalloc.start()
+
+    # Warm up caches (including the interpreter's own)
+    for i in range(20):
+        function()
+
+    worst = 0
+    for i in range(num_frames):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        function()
+        worst = max(worst,tracemalloc.get_traced_memory()[1] - before)
+
+    tracemalloc.stop()
+
+    return worst
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    try:
+        num_frames = int(argv[0])
+    except IndexError:
+        num_frames = 100
+
+    display = build_display()
+    chain_shape = display._chain_matrix.shape
+    frame_bytes = display._chain_matrix.nbytes
+
+    print("chain frame size: {} bytes".format(frame_bytes))
+    print("{:>24s} {:>16s}".format("path","bytes/frame"))
+
+    # Original path: int64 chain converted to uint8 and copied into PIL
+    legacy_chain = np.zeros(chain_shape[:2] + (3,),dtype=np.int64)
+    def legacy():
+        matrix = np.uint8(legacy_chain)
+        if Image is not None:
+            Image.fromarray(matrix)
+
+    print("{:>24s} {:>16d}".format("legacy int64 chain",
+                                   bytes_per_frame(legacy,num_frames)))
+
+    for dtype in (np.uint8,np.int64,np.float64):
+        image = np.random.randint(0,256,(display._total_x_size,
+                                         display._total_y_size,4)).astype(dtype)
+        label = "draw {} RGBA".format(np.dtype(dtype).name)
+        print("{:>24s} {:>16d}".format(label,
+                                       bytes_per_frame(lambda: display.draw(image),
+                                                       num_frames)))
+
+    # Refresh the RGB image handed to rgbmatrix the way RgbmatrixBackend does
+    if Image is not None:
+        chain_image = ChainImage()
+        chain = display._chain_matrix
+        print("{:>24s} {:>16d}".format("RGB image refresh",
+                                       bytes_per_frame(lambda: chain_image.update(chain),
+                                                       num_frames)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+__description__ = \
+"""
+Benchmark the built-in Life generator on grids from 64x64 to 512x512: single
+steps, a batched 100-step burn in and full frames (a step plus
+rendering with a colormap and 50 steps of history).
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+__usage__ = "python generators.py [num_steps]"
+
+import sys, timeit
+
+import numpy as np
+from ledsart.generators import Life
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    try:
+        num_steps = int(argv[0])
+    except IndexError:
+        num_steps = 200
+
+    gray = lambda v: np.stack([v,v,v,np.ones(v.shape)],axis=-1)
+
+    print("{:>9s} {:>12s} {:>14s} {:>14s}".format("grid","step (ms)",
+                                                 "burn 100 (ms)","frame (ms)"))
+    for size in (64,128,256,512):
+
+        life = Life(size,size,0.4,seed=0)
+        step = min(timeit.repeat(life.iterate,number=num_steps,repeat=3))/num_steps
+        burn = min(timeit.repeat(lambda: life.iterate(100),number=1,repeat=3))
+
+        life.as_rgba(gray,history_length=50)
+        def render():
+            life.iterate()
+            life.as_rgba(gray,history_length=50)
+        frame = min(timeit.repeat(render,number=num_steps,repeat=3))/num_steps
+
+        print("{:>9s} {:12.3f} {:14.3f} {:14.3f}".format("{0}x{0}".format(size),
+                                                         step*1000,burn*1000,
+                                                         frame*1000))
+
+if __name__ == "__main__":
+    main()
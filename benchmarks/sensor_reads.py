@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+__description__ = \
+"""
+Time sensor reads against the simulated GPIO, comparing polled reads with
+edge-event driven sensors sampled in the background.  Runs on any machine.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+__usage__ = "python sensor_reads.py [num_reads]"
+
+import sys, time, timeit
+
+from ledsart import gpio, sensors
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    try:
+        num_reads = int(argv[0])
+    except IndexError:
+        num_reads = 200
+
+    simulated = gpio.SimulatedGPIO()
+    gpio.set_gpio(simulated)
+
+    # Range finder 1 m away: 5.9 ms echo
+    simulated.set_echo(5,3,distance=1.0)
+
+    polled_range = sensors.Sensor(sensors.UltrasonicRange(5,3,timeout=100000),
+                                  "iteration_interval")
+    polled_button = sensors.Sensor(sensors.Button(8),"choose_new_plot")
+
+    simulated.set_echo(15,13,distance=1.0)
+    event_range = sensors.Sensor(sensors.UltrasonicRange(15,13,use_events=True),
+                                 "iteration_interval")
+    event_button = sensors.Sensor(sensors.Button(18,use_events=True),
+                                  "choose_new_plot")
+    event_range.start_sampling(0.02)
+    event_button.start_sampling(0.02)
+    time.sleep(0.1)
+
+    print("{:>24s} {:>14s}".format("sensor","us/read"))
+    for label, s in (("polled range finder",polled_range),
+                     ("polled button",polled_button),
+                     ("sampled range finder",event_range),
+                     ("sampled button",event_button)):
+
+        # Polled range finder reads take milliseconds; don't wait forever
+        n = num_reads
+        if label == "polled range finder":
+            n = max(1,num_reads//20)
+
+        t = timeit.timeit(s.current_value,number=n)/n
+        print("{:>24s} {:>14.2f}".format(label,t*1e6))
+
+    event_range.stop_sampling()
+    event_button.stop_sampling()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+__description__ = \
+"""
+Benchmark the render pipeline (Display.draw with and without resampling, the
+conversion done by RgbmatrixBackend.draw, the built-in generators and full
+ArtInstallation loop iterations) across a range of wall sizes, drawing to the
+null backend.  Results are written as JSON so they can be compared between
+releases.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+__usage__ = "python suite.py [--quick] [--output results.json] [--compare old.json]"
+
+import sys, json, time, timeit, platform, argparse, threading
+
+import numpy as np
+import ledsart
+from ledsart.generators import Life
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+class SyntheticGenerator:
+    """
+    Cheap generator that scrolls a random pattern, so every frame differs.
+    """
+
+    def __init__(self,x_size=64,y_size=64):
+
+        self._pattern = np.random.randint(0,256,(x_size,y_size,4)).astype(np.uint8)
+        self._step = 0
+
+    def iterate(self):
+
+        self._step += 1
+
+    def as_rgba(self):
+
+        return np.roll(self._pattern,self._step,axis=1)
+
+
+def build_display(panels_per_side,panel_size,rotations,resample="nearest"):
+    """
+    Build a square wall of panels with a snaking chain.  rotations is "none"
+    (every panel upright), "snake" (alternate rows flipped) or "mixed" (cycle
+    through 0, 90, 180 and 270 degrees).  resample is passed to Display.
+    """
+
+    layout = [[ledsart.Panel(panel_size,panel_size)
+               for j in range(panels_per_side)]
+              for i in range(panels_per_side)]
+
+    chain = []
+    for i, row in enumerate(layout):
+        if i % 2 == 0:
+            chain.extend(row)
+        else:
+            chain.extend(row[::-1])
+
+    if rotations == "none":
+        rotation = [0 for p in chain]
+    elif rotations == "snake":
+        rotation = [180*((i//panels_per_side) % 2) for i in range(len(chain))]
+    else:
+        rotation = [(90*i) % 360 for i in range(len(chain))]
+
+    return ledsart.Display(layout,chain,rotation,backend="null",
+                           resample=resample)
+
+def time_function(function,number,repeat):
+    """
+    Return the mean and best time (in ms) per call.
+    """
+
+    times = timeit.repeat(function,number=number,repeat=repeat)
+    times = np.array(times)/number*1000
+
+    return float(np.mean(times)), float(np.min(times))
+
+def bench_display_draw(quick=False):
+    """
+    Display.draw for a matrix of layouts, panel sizes and rotations.
+    """
+
+    results = []
+
+    if quick:
+        sides, sizes, number, repeat = (1,2,4), (16,32), 20, 3
+    else:
+        sides, sizes, number, repeat = (1,2,4,8), (16,32,64), 50, 5
+
+    for panels_per_side in sides:
+        for panel_size in sizes:
+            for rotations in ("none","snake","mixed"):
+
+                display = build_display(panels_per_side,panel_size,rotations)
+                shape = (display._total_x_size,display._total_y_size,4)
+
+                # Alternate between two frames so nothing is skipped
+                images = [np.random.randint(0,256,shape).astype(np.uint8)
+                          for i in range(2)]
+                counter = [0]
+                def draw():
+                    counter[0] += 1
+                    display.draw(images[counter[0] % 2])
+
+                mean_ms, best_ms = time_function(draw,number,repeat)
+                results.append({"benchmark":"display_draw",
+                                "panels":panels_per_side**2,
+                                "panel_size":panel_size,
+                                "rotations":rotations,
+                                "pixels":shape[0]*shape[1],
+                                "mean_ms":mean_ms,
+                                "best_ms":best_ms})
+
+    return results
+
+def bench_resample(quick=False):
+    """
+    Display.draw with input images smaller and larger than the wall, for
+    nearest and box resampling.
+    """
+
+    results = []
+
+    if quick:
+        sides, number, repeat = (2,4), 20, 3
+    else:
+        sides, number, repeat = (1,2,4,8), 50, 5
+
+    for panels_per_side in sides:
+        for resample in ("nearest","box"):
+            for factor in (0.5,2):
+
+                display = build_display(panels_per_side,32,"snake",resample)
+                shape = (int(display._total_x_size*factor),
+                         int(display._total_y_size*factor),4)
+
+                images = [np.random.randint(0,256,shape).astype(np.uint8)
+                          for i in range(2)]
+                counter = [0]
+                def draw():
+                    counter[0] += 1
+                    display.draw(images[counter[0] % 2])
+
+                mean_ms, best_ms = time_function(draw,number,repeat)
+                results.append({"benchmark":"resample",
+                                "panels":panels_per_side**2,
+                                "panel_size":32,
+                                "resample":resample,
+                                "input_scale":factor,
+                                "mean_ms":mean_ms,
+                                "best_ms":best_ms})
+
+    return results
+
+def bench_backend_conversion(quick=False):
+    """
+    Conversion of the chain to a PIL image, as done in RgbmatrixBackend.draw:
+    wrapping the uint8 RGBX chain with Image.frombuffer versus the original
+    np.uint8 + Image.fromarray of an int64 chain.
+    """
+
+    if Image is None:
+        return []
+
+    results = []
+
+    if quick:
+        sides, number, repeat = (2,4), 20, 3
+    else:
+        sides, number, repeat = (1,2,4,8), 50, 5
+
+    for panels_per_side in sides:
+
+        display = build_display(panels_per_side,32,"none")
+        chain = display._chain_matrix
+        size = (chain.shape[1],chain.shape[0])
+        legacy_chain = chain[:,:,:3].astype(np.int64)
+
+        def wrap():
+            Image.frombuffer("RGBX",size,chain,"raw","RGBX",0,1)
+
+        def legacy():
+            Image.fromarray(np.uint8(legacy_chain))
+
+        for method, function in (("frombuffer",wrap),("fromarray",legacy)):
+            mean_ms, best_ms = time_function(function,number,repeat)
+            results.append({"benchmark":"backend_conversion",
+                            "panels":panels_per_side**2,
+                            "panel_size":32,
+                            "method":method,
+                            "mean_ms":mean_ms,
+                            "best_ms":best_ms})
+
+    return results
+
+def bench_loop(quick=False):
+    """
+    Frames per second drawn by a full ArtInstallation loop with a synthetic
+    generator and no frame interval.  Frames generated but dropped by the
+    render thread are reported separately and do not count towards fps.
+    """
+
+    results = []
+
+    duration = 0.5 if quick else 2.0
+    sides = (2,4) if quick else (1,2,4,8)
+
+    for panels_per_side in sides:
+        for render_thread in (False,True):
+
+            display = build_display(panels_per_side,32,"snake")
+            config = {"x_size":display._total_x_size,
+                      "y_size":display._total_y_size}
+
+            installation = ledsart.ArtInstallation(SyntheticGenerator,display,
+                                                   generator_configs=(config,),
+                                                   iteration_interval=0,
+                                                   min_iteration_interval=0,
+                                                   num_iterations=10**9,
+                                                   burn_in=0,
+                                                   render_thread=render_thread)
+
+            timer = threading.Timer(duration,installation.stop)
+            start = time.perf_counter()
+            timer.start()
+            installation.run()
+            elapsed = time.perf_counter() - start
+
+            stats = installation.stats()
+            results.append({"benchmark":"loop",
+                            "panels":panels_per_side**2,
+                            "panel_size":32,
+                            "render_thread":render_thread,
+                            "frames":stats["frames"],
+                            "generated_frames":installation._iteration_counter,
+                            "dropped_frames":stats["dropped_frames"],
+                            "fps":stats["frames"]/elapsed})
+
+    return results
+
+def bench_generators(quick=False):
+    """
+    Life generator steps (one at a time and batched) on grids from 64x64 to
+    512x512.
+    """
+
+    results = []
+
+    if quick:
+        sizes, number, repeat = (64,256), 20, 3
+    else:
+        sizes, number, repeat = (64,128,256,512), 100, 5
+
+    for size in sizes:
+
+        life = Life(size,size,0.4,seed=0)
+        for method, function in (("iterate",life.iterate),
+                                 ("iterate_100",lambda: life.iterate(100))):
+            mean_ms, best_ms = time_function(function,number,repeat)
+            results.append({"benchmark":"generator",
+                            "generator":"Life",
+                            "size":size,
+                            "method":method,
+                            "mean_ms":mean_ms,
+                            "best_ms":best_ms})
+
+    return results
+
+def _result_key(result):
+    """
+    Key identifying a benchmark configuration (everything except timings).
+    """
+
+    timings = ("mean_ms","best_ms","fps","frames","generated_frames",
+               "dropped_frames")
+
+    return tuple(sorted([(k,v) for k,v in result.items() if k not in timings]))
+
+def compare(old_results,new_results):
+    """
+    Print how each benchmark changed relative to an earlier run.  Ratios above
+    1 are slower for timings and faster for frame rates.
+    """
+
+    old = dict([(_result_key(r),r) for r in old_results])
+
+    for r in new_results:
+        key = _result_key(r)
+        if key not in old:
+            continue
+
+        if "fps" in r:
+            ratio = r["fps"]/old[key]["fps"]
+            label = "fps x"
+        else:
+            ratio = r["mean_ms"]/old[key]["mean_ms"]
+            label = "time x"
+
+        description = ", ".join(["{}={}".format(k,v) for k,v in key])
+        sys.stderr.write("{:>8s} {:6.2f}  {}\n".format(label,ratio,description))
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument("--quick",action="store_true",
+                        help="run a smaller set of benchmarks")
+    parser.add_argument("--output",default=None,
+                        help="file to write JSON results to (default stdout)")
+    parser.add_argument("--compare",default=None,
+                        help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    results.extend(bench_display_draw(args.quick))
+    results.extend(bench_resample(args.quick))
+    results.extend(bench_backend_conversion(args.quick))
+    results.extend(bench_generators(args.quick))
+    results.extend(bench_loop(args.quick))
+
+    out = {"meta":{"time":time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "python":platform.python_version(),
+                   "numpy":np.__version__,
+                   "machine":platform.machine(),
+                   "platform":platform.platform()},
+           "results":results}
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(json.load(f)["results"],results)
+
+    text = json.dumps(out,indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output,"w") as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
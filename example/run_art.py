@@ -6,8 +6,8 @@ __author__ = "Michael J. Harms"
 __date__ = "2017-01-01"
 __usage__ = ""
 
-import conway
 import ledsart
+from ledsart.generators import Life
 from ledsart import sensors
 from matplotlib import cm
 
@@ -16,7 +16,7 @@ from matplotlib import cm
 # Define the class we'll use to generate the graphic (in this case, Conway's
 # game of life).  This generator should have two public methods: .iterate() 
 # (no arguments) and .as_rgba(kwargs).  
-generator = conway.Conway
+generator = Life
 
 # Create a tuple of dictionaries holding information necessary to initialize a 
 # new generator.  The installation will randomally select from these when it
@@ -85,7 +85,7 @@ display = ledsart.Display(layout,chain,rotation,backend="rgbmatrix")
 
 # ----------- Create the final ArtInstallation instance ---------------
 
-installation = ledsart.ArtInstallation(conway.Conway,
+installation = ledsart.ArtInstallation(generator,
                                        display,
                                        generator_configs=generator_configs,
                                        plot_configs=plot_configs,
@@ -114,5 +114,8 @@ try:
     installation.run()
 except KeyboardInterrupt:
     pass
+finally:
+    installation.close()
+    display.close()
 
 
@@ -5,7 +5,13 @@ Class for displaying art on LED panels.
 __author__ = "Michael J. Harms"
 __date__ = "2017-01-01"
 
-__all__ = ["display","art","sensors"]
+__all__ = ["display","art","sensors","lookahead","cache","colormap",
+           "scheduler","gpio","stats","history",
+           "generators","daemon","compositor"]
 
 from .art import ArtInstallation
-from .display import Panel, Display
+from .display import Panel, Display, DisplayGroup
+from .cache import StateCache
+from .colormap import ColormapLUT
+from .history import History, with_trails
+from .compositor import Compositor, Region
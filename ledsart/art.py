@@ -4,7 +4,28 @@ __description__ = \
 __author__ = "Michael J. Harms"
 __date__ = "2017-01-01"
 
-import random, time
+import random, time, threading, queue, collections, asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .lookahead import LookaheadGenerator
+from .scheduler import FrameScheduler
+from .colormap import ColormapLUT
+from .stats import LoopStats, StatsWriter
+from .generators import advance, takes_out
+from .display import DisplayGroup
+
+import numpy as np
+
+def _close(iterator):
+    """
+    Release the resources of a generator (worker processes, thread pools)
+    if it has a .close() method.
+    """
+
+    close = getattr(iterator,"close",None)
+    if close is not None:
+        close()
+
 
 class ArtInstallation:
     """
@@ -19,7 +40,18 @@ class ArtInstallation:
                  sampling_rate=0.1,
                  iteration_interval=1,
                  num_iterations=1000,
-                 burn_in=50):
+                 burn_in=50,
+                 render_thread=False,
+                 queue_depth=2,
+                 frame_policy="drop_oldest",
+                 lookahead=0,
+                 warm_standby=False,
+                 state_cache=None,
+                 late_tolerance=0.005,
+                 stats_file=None,
+                 stats_socket=None,
+                 stats_interval=10.0,
+                 min_iteration_interval=0.001):
         """
         Initialize an ArtInstallation object.
 
@@ -27,11 +59,23 @@ class ArtInstallation:
                    round.  The class should take **kwargs in generator_configs
                    to its __init__ function, expose the expose .iterate() and
                    .as_rgba().  .as_rgba should take the **kwargs in
-                   plot_configs.
+                   plot_configs.  If a plot config has a "cmap" and the
+                   generator also exposes .as_values(), which takes the other
+                   plot_configs **kwargs and returns a 2D array of values
+                   between 0 and 1 (or integer colormap indexes), frames are
+                   colorized with a precomputed ColormapLUT instead of
+                   calling .as_rgba.  If the generator exposes
+                   .iterate_many(n) (see generators.IterateManyMixin), it is
+                   used to burn in and skip ahead in a single call.  If
+                   .as_rgba (or .as_values) takes an out argument and the
+                   display has .frame_buffer(), frames are rendered into a
+                   pool of reused buffers rather than new arrays.
 
         display: an instance of a class that actually draws the output of the
                  generator.  It should expose .draw(), which takes the 
-                 output of the generator as an argument.
+                 output of the generator as an argument.  A list of
+                 Displays is wrapped in a DisplayGroup, so every display is
+                 drawn from the same frames.
 
         generator_config: list of dictionaries.  Each of dictionary should be
                           passable as **kwargs to the generator __init__ 
@@ -43,22 +87,81 @@ class ArtInstallation:
                      installation will randomly select different plotting
                      configurations.
 
-        sampling_rate: how long to wait between loops in the main .run()
-                       function.
+        sampling_rate: how long (in seconds) to wait between sensor checks in
+                       the main .run() function.
 
-        iteration_interval: how long (in seconds) to wait between iterations.   
+        iteration_interval: how long (in seconds) to wait between iterations.
+                            Frames are scheduled on a fixed grid, so
+                            1/iteration_interval is the frame rate.
 
         num_iterations: how long to iterate each generator before randomly 
 
-        burn_in: how many times to run the iterate() before first display                        
- 
+        burn_in: how many times to run the iterate() before first display
+
+        render_thread: if True, generated frames are put on a queue and drawn
+                       by a dedicated thread, so a slow generator step does
+                       not delay the display (and vice versa).  Frames
+                       returned by .as_rgba must not be modified by the
+                       generator after they are returned.
+
+        queue_depth: maximum number of frames waiting to be drawn when using
+                     the render thread.
+
+        frame_policy: what to do when the frame queue is full.  "drop_oldest"
+                      throws away the oldest waiting frame; "block" waits
+                      until the render thread takes a frame.
+
+        lookahead: if > 0, run the generator in a worker process that computes
+                   up to this many frames ahead into shared memory.  The
+                   generator class must be importable by the worker.  Call
+                   .close() to shut the worker down.
+
+        warm_standby: if True, the next generator is created and burned in on
+                      a background thread while the current one is shown, so
+                      switching generators does not stall the display.
+
+        state_cache: a StateCache instance.  If given, burned-in generators
+                     are stored on disk and reused rather than burned in
+                     again.  Generator instances must be picklable.
+
+        late_tolerance: how late (in seconds) a frame can start before it is
+                        counted as late in .stats().
+
+        stats_file: if given, write .stats() in Prometheus text format to this
+                    file every stats_interval seconds while running.
+
+        stats_socket: if given, serve .stats() in Prometheus text format on a
+                      Unix socket at this path while running.
+
+        stats_interval: how often (in seconds) to refresh the exported stats.
+
+        min_iteration_interval: shortest time (in seconds) between frames,
+                                however small iteration_interval gets (e.g.
+                                from a sensor), so the loop never spins at
+                                100% CPU.  Set to 0 to run as fast as
+                                possible when iteration_interval is 0.
         """
 
+        self._scheduler = FrameScheduler()
+        self._stats = LoopStats()
+        self.late_tolerance = late_tolerance
+        self.stats_file = stats_file
+        self.stats_socket = stats_socket
+        self.stats_interval = stats_interval
+        self._frame_deadline = 0.0
+        self._sensor_deadline = 0.0
+        self._new_generator_requested = False
+        self._new_plot_requested = False
+        self._skip_ahead = 0
+
         self._generator = generator
+        if isinstance(display,(list,tuple)):
+            display = DisplayGroup(display)
         self._display = display
         self._generator_configs = generator_configs
         self._plot_configs = plot_configs
         self.sampling_rate = sampling_rate
+        self._min_iteration_interval = min_iteration_interval
         self.iteration_interval = iteration_interval
         self.num_iterations = num_iterations
         self.burn_in = burn_in
@@ -67,9 +170,54 @@ class ArtInstallation:
 
         self._run_loop = False
         self._loaded_sensors = []
+        self._sensors_changed = False
+
+        if int(queue_depth) < 1:
+            err = "queue_depth must be an integer >= 1.\n"
+            raise ValueError(err)
+        queue_depth = int(queue_depth)
+
+        if frame_policy not in ("drop_oldest","block"):
+            err = "frame_policy must be 'drop_oldest' or 'block'.\n"
+            raise ValueError(err)
+
+        self.render_thread = render_thread
+        self._frame_policy = frame_policy
+        self._frame_queue = queue.Queue(maxsize=queue_depth)
+        self._render_thread = None
+        self._render_error = None
+        self._dropped_frames = 0
+
+        self.lookahead = lookahead
+        self._iterator = None
+
+        self.warm_standby = warm_standby
+        self._standby = None
+        self._standby_executor = None
+        self._last_switch_time = 0.0
+
+        self.state_cache = state_cache
+
+        # Pool of reusable frame buffers for generators that can render into
+        # one.  With a render thread, a buffer can be waiting in the queue,
+        # being drawn, or being rendered into.
+        # The buffers are sized from the first frame of each generator, as
+        # the display may resample frames of other sizes.
+        self._frame_buffers = []
+        self._free_buffers = collections.deque()
+        self._values_buffer = None
+        self._buffer_shape = None
+        self._pool_shape = None
+        self._num_buffers = 0
+        if hasattr(display,"frame_buffer"):
+            self._num_buffers = 1
+            if self.render_thread:
+                self._num_buffers = queue_depth + 2
+        self._rgba_out = False
+        self._values_out = False
 
-        self._choose_new_generator()
         self._choose_new_plot()
+        self._choose_new_generator()
 
     def run(self):
         """
@@ -77,21 +225,102 @@ class ArtInstallation:
         """
 
         self._run_loop = True
-        self._run()
 
-    def _choose_new_generator(self):
+        writer = None
+        if self.stats_file is not None or self.stats_socket is not None:
+            writer = StatsWriter(self.stats,path=self.stats_file,
+                                 socket_path=self.stats_socket,
+                                 interval=self.stats_interval)
+            writer.start()
+
+        if self.render_thread:
+            self._render_error = None
+            self._render_thread = threading.Thread(target=self._render)
+            self._render_thread.daemon = True
+            self._render_thread.start()
+
+        try:
+            self._run()
+        finally:
+            if self._render_thread is not None:
+                self._stop_render_thread()
+            if writer is not None:
+                writer.stop()
+
+        # An error drawing the last frames
+        self._check_render_thread()
+
+    def _pick_generator_config(self):
         """
-        Choose a new generator and burn in.
+        Randomly choose a generator configuration.
         """
 
-        # Create a new generator
         config = {}
         if len(self._generator_configs) != 0:
             config = random.choice(self._generator_configs)
-        self._iterator = self._generator(**config)
 
-        for i in range(self.burn_in):
-            self._iterator.iterate()
+        return config
+
+    def _build_generator(self,config):
+        """
+        Create a new generator and burn it in.  This may run on the standby
+        thread, so it should not touch the current generator.
+        """
+
+        if self.lookahead > 0:
+
+            # Frames waiting in the render queue must not be overwritten
+            hold = 1
+            if self.render_thread:
+                hold = self._frame_queue.maxsize + 2
+
+            return LookaheadGenerator(self._generator,config,
+                                      self._plot_setting,
+                                      burn_in=self.burn_in,
+                                      lookahead=self.lookahead,
+                                      hold=hold,
+                                      state_cache=self.state_cache)
+
+        if self.state_cache is not None:
+            return self.state_cache.build(self._generator,config,self.burn_in)
+
+        iterator = self._generator(**config)
+        advance(iterator,self.burn_in)
+
+        return iterator
+
+    def _choose_new_generator(self):
+        """
+        Choose a new generator and burn in.  If using a warm standby, swap in
+        the generator prepared in the background and start preparing the next
+        one.
+        """
+
+        start = time.perf_counter()
+
+        if self._standby is not None:
+            new_iterator = self._standby.result()
+            self._standby = None
+        else:
+            new_iterator = self._build_generator(self._pick_generator_config())
+
+        _close(self._iterator)
+        self._iterator = new_iterator
+
+        self._buffer_shape = None
+        self._rgba_out = takes_out(getattr(new_iterator,"as_rgba",None))
+        self._values_out = takes_out(getattr(new_iterator,"as_values",None))
+
+        if self.warm_standby:
+            # Made here (rather than in __init__) so it is recreated if the
+            # installation is used again after close()
+            if self._standby_executor is None:
+                self._standby_executor = ThreadPoolExecutor(max_workers=1)
+            self._standby = self._standby_executor.submit(self._build_generator,
+                                                          self._pick_generator_config())
+
+        self._last_switch_time = time.perf_counter() - start
+        self._stats.record("switch",int(self._last_switch_time*1e9))
 
     def _choose_new_plot(self):
         """
@@ -103,47 +332,529 @@ class ArtInstallation:
             plot_config = random.choice(self._plot_configs)
         self._plot_setting = plot_config
 
+        # The colormap lookup table is built when first used (see
+        # _render_frame).  cmap=None is left to the generator.
+        self._lut = None
+        self._lut_cmap = plot_config.get("cmap",None)
+        self._value_setting = dict([(k,v) for k,v in plot_config.items()
+                                    if k != "cmap"])
+
+    def _render_frame(self):
+        """
+        Get the current frame from the generator, colorizing it with the
+        colormap lookup table if the generator supports it.
+        """
+
+        use_lut = self._lut_cmap is not None and hasattr(self._iterator,"as_values")
+        if use_lut and self._lut is None:
+            self._lut = ColormapLUT(self._lut_cmap)
+
+        # The first frame from a generator sets the size of the buffers
+        if self._buffer_shape is None:
+            if use_lut:
+                frame = self._lut.apply(self._iterator.as_values(**self._value_setting))
+            else:
+                frame = self._iterator.as_rgba(**self._plot_setting)
+            self._size_buffers(np.shape(frame)[:2])
+            return frame
+
+        out = None
+        if (use_lut or self._rgba_out) and len(self._free_buffers) > 0:
+            out = self._free_buffers.popleft()
+
+        if use_lut:
+            if self._values_out:
+                values = self._iterator.as_values(out=self._values_buffer,
+                                                  **self._value_setting)
+            else:
+                values = self._iterator.as_values(**self._value_setting)
+            frame = self._lut.apply(values,out=out)
+        elif out is not None:
+            frame = self._iterator.as_rgba(out=out,**self._plot_setting)
+        else:
+            frame = self._iterator.as_rgba(**self._plot_setting)
+
+        # If the generator did not use the buffer, it is free again
+        if out is not None and frame is not out:
+            self._free_buffers.append(out)
+
+        return frame
+
+    def _size_buffers(self,shape):
+        """
+        Make sure the frame buffer pool holds (x,y,4) uint8 buffers of shape.
+        Buffers of another size that are still waiting to be drawn are just
+        dropped from the pool.
+        """
+
+        shape = tuple(shape)
+        self._buffer_shape = shape
+        if shape == self._pool_shape or self._num_buffers == 0:
+            return
+
+        if shape == tuple(self._display.shape):
+            buffers = [self._display.frame_buffer()
+                       for i in range(self._num_buffers)]
+        else:
+            buffers = [np.zeros(shape + (4,),dtype=np.uint8)
+                       for i in range(self._num_buffers)]
+
+        self._frame_buffers = buffers
+        self._free_buffers.clear()
+        self._free_buffers.extend(buffers)
+        self._values_buffer = np.zeros(shape,dtype=float)
+        self._pool_shape = shape
+
+    def _release(self,frame):
+        """
+        Return a frame to the buffer pool once it has been drawn or dropped
+        (if it came from the pool).
+        """
+
+        for b in self._frame_buffers:
+            if frame is b:
+                self._free_buffers.append(frame)
+                return
 
     def _run(self):
         """
         Main loop that runs continuously on its own thread.  Only invoke by
-        self.run().
+        self.run().  Sleeps until the next frame or sensor deadline, or until
+        woken by .wake().
         """
 
-        self._iteration_counter = 0
-        self._last_time_switched = time.time() - self.iteration_interval
+        self._start_loop()
 
         while self._run_loop:
 
-            # Update the display if we've waited long enough
-            if time.time() - self._last_time_switched > self.iteration_interval:
-                self._iterator.iterate()
-                self._display.draw(self._iterator.as_rgba(**self._plot_setting))
+            now = self._scheduler.now()
+
+            # Update the display if we've reached the frame deadline
+            if now >= self._frame_deadline:
+                self._show(self._next_frame(now))
+
+            polled = self._housekeeping(now)
+
+            # Wait until the next deadline
+            self._scheduler.wait_until(self._next_deadline(polled))
 
-                self._last_time_switched = time.time()
-                self._iteration_counter += 1
+        return None
 
-            # Create a new generator, if we've run this generator for enough iterations
-            if self._iteration_counter > self.num_iterations:
-                self._choose_new_generator()
-                self._choose_new_plot()
-                self._iteration_counter = 0
+    def _start_loop(self):
+        """
+        Reset the iteration counter and deadlines at the start of a run.
+        """
 
-            # Check sensor(s), if loaded, and update based on those sensors.
-            self._check_sensors() 
+        self._iteration_counter = 0
 
-            if self.choose_new_plot:
-                self.choose_new_plot = False
-                self._choose_new_plot()
+        self._frame_deadline = self._scheduler.now()
+        self._sensor_deadline = self._frame_deadline
 
-            if self.choose_new_generator:
-                self.choose_new_generator = False
-                self._choose_new_generator()
+    def _next_frame(self,now):
+        """
+        Advance the generator and render the next frame, scheduling the frame
+        after it.  now is the time the frame was due to start.
+        """
 
-            # Wait until next time step
-            time.sleep(self.sampling_rate)
+        self._scheduler.record_frame(self._frame_deadline,now)
+        if now - self._frame_deadline > self.late_tolerance:
+            self._stats.late_frames += 1
 
-        return None
+        if self._skip_ahead > 0:
+            skip = self._skip_ahead
+            self._skip_ahead = 0
+            t0 = time.perf_counter_ns()
+            advance(self._iterator,skip)
+            self._stats.record("skip",time.perf_counter_ns() - t0)
+
+        t0 = time.perf_counter_ns()
+        self._iterator.iterate()
+        t1 = time.perf_counter_ns()
+        frame = self._render_frame()
+        t2 = time.perf_counter_ns()
+        self._stats.record("iterate",t1 - t0)
+        self._stats.record("as_rgba",t2 - t1)
+
+        self._iteration_counter += 1
+
+        # Keep frames on a fixed grid unless we've fallen more than a whole
+        # frame behind.
+        self._frame_deadline += self._frame_interval
+        if self._frame_deadline < now:
+            self._frame_deadline = now + self._frame_interval
+
+        return frame
+
+    def _housekeeping(self,now):
+        """
+        Switch generators and plots when due or requested, and check sensors.
+        Returns the list of polled sensors.
+        """
+
+        # Create a new generator, if we've run this generator for enough iterations
+        if self._iteration_counter > self.num_iterations:
+            self._choose_new_plot()
+            self._choose_new_generator()
+            self._iteration_counter = 0
+
+        # Check sensor(s), if loaded, and update based on those sensors.
+        # Sensors sampled in the background wake us when they change; the
+        # rest are polled every sampling_rate seconds.
+        polled = self._polled_sensors()
+        if self._sensors_changed or \
+           (len(polled) > 0 and now >= self._sensor_deadline):
+            self._sensors_changed = False
+            t0 = time.perf_counter_ns()
+            self._check_sensors()
+            self._stats.record("sensors",time.perf_counter_ns() - t0)
+            self._sensor_deadline = now + self.sampling_rate
+
+        if self._new_plot_requested:
+            self._new_plot_requested = False
+            self._choose_new_plot()
+
+        if self._new_generator_requested:
+            self._new_generator_requested = False
+            self._choose_new_generator()
+
+        return polled
+
+    def _next_deadline(self,polled):
+        """
+        When the loop next has something to do.
+        """
+
+        deadline = self._frame_deadline
+        if len(polled) > 0:
+            deadline = min(deadline,self._sensor_deadline)
+
+        return deadline
+
+    async def run_async(self,executor=None):
+        """
+        Run the main loop as a coroutine on the running asyncio event loop.
+        Generator steps, generator switches, polled sensor reads and display
+        draws block, so they are run on executor (by default, a single worker
+        thread owned by this installation, so several installations can share
+        one event loop without blocking each other).  A display with a
+        coroutine .draw_async(frame) is awaited directly instead.  Between
+        frames the coroutine just waits, so an idle installation costs no
+        CPU.  Stop with .stop() or by cancelling the task; either way the
+        step in progress finishes before this returns.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadPoolExecutor(max_workers=1)
+
+        self._run_loop = True
+        self._scheduler.attach_loop(loop)
+
+        writer = None
+        if self.stats_file is not None or self.stats_socket is not None:
+            writer = StatsWriter(self.stats,path=self.stats_file,
+                                 socket_path=self.stats_socket,
+                                 interval=self.stats_interval)
+            writer.start()
+
+        pending = None
+        try:
+            self._start_loop()
+
+            while self._run_loop:
+
+                now = self._scheduler.now()
+
+                if now >= self._frame_deadline:
+                    pending = executor.submit(self._next_frame,now)
+                    frame = await asyncio.wrap_future(pending)
+                    pending = None
+
+                    draw_async = getattr(self._display,"draw_async",None)
+                    if draw_async is not None:
+                        await self._draw_async(draw_async,frame)
+                    else:
+                        pending = executor.submit(self._show_now,frame)
+                        await asyncio.wrap_future(pending)
+                        pending = None
+
+                pending = executor.submit(self._housekeeping,now)
+                polled = await asyncio.wrap_future(pending)
+                pending = None
+
+                await self._scheduler.wait_until_async(self._next_deadline(polled))
+
+        finally:
+            self._run_loop = False
+
+            # Let a step that was cancelled mid-flight finish, so the
+            # generator and display are left in a consistent state.
+            if pending is not None and not pending.done():
+                try:
+                    await asyncio.wrap_future(pending)
+                except (asyncio.CancelledError,Exception):
+                    pass
+
+            self._scheduler.detach_loop()
+            if own_executor:
+                executor.shutdown(wait=True)
+            if writer is not None:
+                writer.stop()
+
+    async def _draw_async(self,draw_async,frame):
+        """
+        Draw a frame with the display's coroutine .draw_async, recording how
+        long it took.
+        """
+
+        start = time.perf_counter_ns()
+        await draw_async(frame)
+        end = time.perf_counter_ns()
+
+        self._stats.record_frame(end)
+        self._stats.record("draw",end - start)
+        self._release(frame)
+
+    def _show_now(self,frame):
+        """
+        Draw a frame directly (not via the render thread).
+        """
+
+        self._draw(frame)
+        self._release(frame)
+
+    @property
+    def iteration_interval(self):
+        """
+        How long (in seconds) to wait between iterations.
+        """
+
+        return self._iteration_interval
+
+    @iteration_interval.setter
+    def iteration_interval(self,iteration_interval):
+
+        old_interval = None
+        if hasattr(self,"_iteration_interval"):
+            old_interval = self._frame_interval
+        self._iteration_interval = iteration_interval
+
+        # Reschedule the next frame relative to the last one
+        if old_interval is not None and old_interval != self._frame_interval:
+            self._frame_deadline += self._frame_interval - old_interval
+            self._scheduler.wake()
+
+    @property
+    def _frame_interval(self):
+        """
+        Time between frames: iteration_interval, but no less than
+        min_iteration_interval.
+        """
+
+        return max(self._iteration_interval,self._min_iteration_interval)
+
+    @property
+    def choose_new_generator(self):
+        """
+        Set to True to switch to a new generator.
+        """
+
+        return self._new_generator_requested
+
+    @choose_new_generator.setter
+    def choose_new_generator(self,value):
+
+        self._new_generator_requested = bool(value)
+        if self._new_generator_requested:
+            self._scheduler.wake()
+
+    @property
+    def choose_new_plot(self):
+        """
+        Set to True to switch to a new plot style.
+        """
+
+        return self._new_plot_requested
+
+    @choose_new_plot.setter
+    def choose_new_plot(self,value):
+
+        self._new_plot_requested = bool(value)
+        if self._new_plot_requested:
+            self._scheduler.wake()
+
+    @property
+    def skip_ahead(self):
+        """
+        Set to a number of steps to advance the generator (without drawing)
+        before the next frame.  Values are rounded to the nearest integer, so
+        a sensor can drive this directly.
+        """
+
+        return self._skip_ahead
+
+    @skip_ahead.setter
+    def skip_ahead(self,value):
+
+        self._skip_ahead = max(0,int(round(value)))
+        if self._skip_ahead > 0:
+            self._scheduler.wake()
+
+    def wake(self):
+        """
+        Wake the main loop immediately (for example, after changing some
+        setting from another thread).
+        """
+
+        self._scheduler.wake()
+
+    def stats(self):
+        """
+        Return a dictionary of statistics for the main loop: frame count and
+        rate, dropped, late and skipped frames, how long the last generator
+        switch blocked, and the count, mean, p50, p95 and p99 (in ms) of each
+        stage (iterate, as_rgba, draw, map, backend, sensors, switch and skip).
+        """
+
+        out = self._stats.summary()
+        out["dropped_frames"] = self._dropped_frames
+        out["last_switch_time"] = self._last_switch_time
+        out["skipped_frames"] = getattr(self._display,"frames_skipped",0)
+
+        return out
+
+    def frame_jitter(self):
+        """
+        Statistics (in seconds) for how late frames started relative to their
+        scheduled times.
+        """
+
+        return self._scheduler.jitter()
+
+    def _show(self,frame):
+        """
+        Send a frame to the display, either directly or via the render thread
+        queue.
+        """
+
+        if self._render_thread is None:
+            self._show_now(frame)
+            return
+
+        self._check_render_thread()
+
+        if self._frame_policy == "block":
+            # Wait for room, giving up if the render thread dies (or the loop
+            # is stopped) in the meantime
+            while True:
+                try:
+                    self._frame_queue.put(frame,timeout=0.1)
+                    return
+                except queue.Full:
+                    self._check_render_thread()
+                    if not self._run_loop:
+                        self._release(frame)
+                        return
+
+        # Drop the oldest waiting frame(s) until there is room for this one
+        while True:
+            try:
+                self._frame_queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self._release(self._frame_queue.get_nowait())
+                    self._dropped_frames += 1
+                except queue.Empty:
+                    pass
+
+    def _render(self):
+        """
+        Draw frames from the frame queue until a None frame is received.  Runs
+        on its own thread.  Only invoke by self.run().
+        """
+
+        while True:
+            frame = self._frame_queue.get()
+            if frame is None:
+                break
+
+            try:
+                self._draw(frame)
+            except Exception as e:
+                # Hand the error to the main loop (see _check_render_thread)
+                self._render_error = e
+                break
+
+            self._release(frame)
+
+    def _check_render_thread(self):
+        """
+        Raise the error that stopped the render thread, if there was one.
+        """
+
+        if self._render_error is not None:
+            error = self._render_error
+            self._render_error = None
+            raise error
+
+        if self._render_thread is not None and \
+           not self._render_thread.is_alive():
+            err = "The render thread stopped unexpectedly.\n"
+            raise RuntimeError(err)
+
+    def _stop_render_thread(self):
+        """
+        Tell the render thread to finish and wait for it, without blocking
+        on a full queue if it has died.  Frames it did not draw are thrown
+        away.
+        """
+
+        while self._render_thread.is_alive():
+            try:
+                self._frame_queue.put(None,timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+        self._render_thread.join()
+        self._render_thread = None
+
+        while True:
+            try:
+                frame = self._frame_queue.get_nowait()
+            except queue.Empty:
+                break
+            if frame is not None:
+                self._release(frame)
+
+    def _draw(self,frame):
+        """
+        Draw a frame on the display, recording how long it took.
+        """
+
+        start = time.perf_counter_ns()
+        self._display.draw(frame)
+        end = time.perf_counter_ns()
+
+        self._stats.record_frame(end)
+        self._stats.record("draw",end - start)
+
+        # Display breaks this down into mapping and the backend
+        map_ns = getattr(self._display,"last_map_time_ns",None)
+        if map_ns is not None:
+            self._stats.record("map",map_ns)
+            self._stats.record("backend",self._display.last_backend_time_ns)
+
+    @property
+    def dropped_frames(self):
+        """
+        Number of frames thrown away because the render thread fell behind.
+        """
+
+        return self._dropped_frames
 
     def stop(self):
         """
@@ -151,15 +862,59 @@ class ArtInstallation:
         """
 
         self._run_loop = False
+        self._scheduler.wake()
+
+    @property
+    def last_switch_time(self):
+        """
+        How long (in seconds) the most recent generator switch blocked the
+        main loop.
+        """
+
+        return self._last_switch_time
+
+    def close(self):
+        """
+        Shut down any generator worker processes and the standby thread.
+        """
+
+        if self._standby is not None:
+            standby = self._standby.result()
+            self._standby = None
+            _close(standby)
+
+        if self._standby_executor is not None:
+            self._standby_executor.shutdown()
+            self._standby_executor = None
+
+        _close(self._iterator)
    
     def _check_sensors(self):
 
         for s in self._loaded_sensors:
-            self.__dict__[s.property_to_mod] = s.read_and_process()
+            setattr(self,s.property_to_mod,s.current_value())
+
+    def _polled_sensors(self):
+        """
+        Sensors that are not being sampled on a background thread.
+        """
+
+        return [s for s in self._loaded_sensors if not s.sampling]
+
+    def _sensor_changed(self):
+        """
+        Called from a sensor's sampling thread when its value changes.
+        """
+
+        self._sensors_changed = True
+        self._scheduler.wake()
 
     def add_sensor(self,s):
         """
+        Add a Sensor.  If the sensor is sampled in the background (see
+        Sensor.start_sampling), the loop is woken whenever its value changes.
         """
 
+        s.on_change = self._sensor_changed
         self._loaded_sensors.append(s)
 
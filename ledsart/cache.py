@@ -0,0 +1,244 @@
+__description__ = \
+"""
+On-disk cache of burned-in generator states.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import os, json, hashlib, pickle, random, inspect, functools
+
+import numpy as np
+
+from .generators import advance
+
+def _takes_seed(generator):
+    """
+    Whether a generator class takes a seed argument.
+    """
+
+    try:
+        return "seed" in inspect.signature(generator).parameters
+    except (TypeError,ValueError):
+        return False
+
+
+def _describe(value):
+    """
+    Describe a value json cannot encode (a class, function, colormap, ...) in
+    a way that is the same from one run to the next.  Raises TypeError for
+    values with no stable description, as their reprs usually hold memory
+    addresses.
+    """
+
+    if isinstance(value,functools.partial):
+        return {"partial":[value.func,list(value.args),value.keywords]}
+
+    if isinstance(value,np.generic):
+        return value.item()
+
+    if isinstance(value,np.ndarray):
+        return value.tolist()
+
+    qualname = getattr(value,"__qualname__",None)
+    if isinstance(qualname,str):
+        if "<" in qualname:
+            err = "{} has no stable name (lambda or local definition)".format(qualname)
+            raise TypeError(err)
+        return "{}.{}".format(value.__module__,qualname)
+
+    # Named objects such as matplotlib colormaps
+    name = getattr(value,"name",None)
+    if isinstance(name,str):
+        return "{}.{}({})".format(type(value).__module__,
+                                  type(value).__qualname__,name)
+
+    # Objects with a repr of their own (e.g. compositor.Region), as long as
+    # it does not hold a memory address
+    if type(value).__repr__ is not object.__repr__:
+        description = repr(value)
+        if " at 0x" not in description:
+            return description
+
+    err = "{} has no stable description".format(type(value).__qualname__)
+    raise TypeError(err)
+
+
+class StateCache:
+    """
+    Store burned-in generator instances on disk so they can be reused on later
+    generator switches (and after restarts) rather than burning in again.
+
+    Snapshots are keyed by the generator class, its configuration, the number
+    of burn-in iterations, and a random seed.  Each configuration has up to
+    num_seeds different snapshots, so the installation does not show the same
+    starting state every time.  The seed is passed to generators that take a
+    seed argument; others are built from whatever random state they use.
+    Snapshots are evicted least-recently-used first once there are more than
+    max_entries of them or they take up more than max_bytes.
+    """
+
+    def __init__(self,directory,max_bytes=50*1024*1024,max_entries=None,
+                 num_seeds=8):
+        """
+        Initialize a StateCache.
+
+        directory: directory in which to store snapshots (created if needed).
+        max_bytes: maximum total size of all snapshots.
+        max_entries: maximum number of snapshots (None for no limit).
+        num_seeds: number of different seeds (and thus snapshots) to use for
+                   each configuration.
+        """
+
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.max_entries = max_entries
+        self.num_seeds = int(num_seeds)
+
+        if self.num_seeds < 1:
+            err = "num_seeds must be an integer >= 1.\n"
+            raise ValueError(err)
+
+        os.makedirs(self.directory,exist_ok=True)
+
+    def key(self,generator,config,burn_in,seed):
+        """
+        Return a stable key for a generator class, configuration dictionary,
+        burn in and seed.  Classes, functions (and functools.partial, e.g.
+        from history.with_trails) and named objects such as colormaps are
+        described by name, and other objects by their repr if it holds no
+        memory address.  Raises ValueError if the generator or config holds
+        anything else that json cannot encode, as it would not give the same
+        key after a restart.
+        """
+
+        description = {"generator":generator,
+                       "config":config,
+                       "burn_in":burn_in,
+                       "seed":seed}
+        try:
+            description = json.dumps(description,sort_keys=True,
+                                     default=_describe)
+        except TypeError as e:
+            err = "generator configuration cannot be cached: {}.\n".format(e)
+            raise ValueError(err)
+
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+    def _path(self,key):
+
+        return os.path.join(self.directory,"{}.pickle".format(key))
+
+    def load(self,key):
+        """
+        Return the generator instance stored under key, or None if it is not
+        in the cache.
+        """
+
+        path = self._path(key)
+        try:
+            with open(path,"rb") as f:
+                iterator = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError,EOFError,AttributeError,ImportError):
+            # Corrupt or stale snapshot; throw it away
+            self._remove(path)
+            return None
+
+        # Mark as recently used
+        os.utime(path,None)
+
+        return iterator
+
+    def save(self,key,iterator):
+        """
+        Store a generator instance under key.  Instances that cannot be
+        pickled are silently not cached.
+        """
+
+        try:
+            data = pickle.dumps(iterator,protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError,TypeError,AttributeError):
+            return
+
+        # Write to a temporary file and move it into place so a crash never
+        # leaves a partial snapshot behind.
+        path = self._path(key)
+        tmp_path = "{}.{}.tmp".format(path,os.getpid())
+        with open(tmp_path,"wb") as f:
+            f.write(data)
+        os.replace(tmp_path,path)
+
+        self._evict()
+
+    def build(self,generator,config,burn_in):
+        """
+        Return a burned-in instance of generator, loading it from the cache if
+        possible and creating (and caching) it otherwise.  Configurations
+        that cannot be given a stable key are built but not cached.
+        """
+
+        seed = random.randrange(self.num_seeds)
+        try:
+            key = self.key(generator,config,burn_in,seed)
+        except ValueError:
+            key = None
+
+        if key is not None:
+            iterator = self.load(key)
+            if iterator is not None:
+                return iterator
+
+        # Generators that take a seed are given one, so the snapshot is a
+        # faithful record of this configuration and seed.  The global random
+        # state is never touched: this may run on the warm standby thread
+        # while the main loop is drawing random numbers.
+        build_config = dict(config)
+        if "seed" not in build_config and _takes_seed(generator):
+            build_config["seed"] = seed
+
+        iterator = generator(**build_config)
+        advance(iterator,burn_in)
+
+        if key is not None:
+            self.save(key,iterator)
+
+        return iterator
+
+    def _remove(self,path):
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """
+        Remove least-recently-used snapshots until the cache is within its
+        size and entry limits.
+        """
+
+        entries = []
+        for f in os.listdir(self.directory):
+            if not f.endswith(".pickle"):
+                continue
+            path = os.path.join(self.directory,f)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime,stat.st_size,path))
+
+        entries.sort()
+
+        total_bytes = sum([e[1] for e in entries])
+        while len(entries) > 0:
+            too_big = total_bytes > self.max_bytes
+            too_many = self.max_entries is not None and \
+                       len(entries) > self.max_entries
+            if not too_big and not too_many:
+                break
+
+            mtime, size, path = entries.pop(0)
+            self._remove(path)
+            total_bytes -= size
@@ -0,0 +1,101 @@
+__description__ = \
+"""
+Precomputed colormap lookup tables.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import numpy as np
+
+class ColormapLUT:
+    """
+    Turn a colormap into a table of uint8 RGBA values once, so frames can be
+    colorized with a single integer indexing operation rather than running the
+    matplotlib colormap machinery on every frame.
+    """
+
+    def __init__(self,cmap,num_entries=256):
+        """
+        Initialize a ColormapLUT.
+
+        cmap: a matplotlib colormap (or any callable that takes an array of
+              values between 0 and 1 and returns RGBA values between 0 and
+              1), or the name of a matplotlib colormap.
+        num_entries: number of entries in the table.
+        """
+
+        if type(cmap) == str:
+            import matplotlib
+            cmap = matplotlib.colormaps[cmap]
+
+        self._num_entries = int(num_entries)
+        if self._num_entries < 2:
+            err = "num_entries must be an integer >= 2.\n"
+            raise ValueError(err)
+
+        rgba = np.asarray(cmap(np.linspace(0,1,self._num_entries)))
+
+        self._table = np.zeros((self._num_entries,4),dtype=np.uint8)
+        self._table[:,:3] = np.round(np.clip(rgba[:,:3],0,1)*255)
+        self._table[:,3] = 255
+
+        self._scaled = None
+        self._index = None
+
+    @property
+    def table(self):
+        """
+        The (num_entries,4) uint8 RGBA lookup table.
+        """
+
+        return self._table
+
+    @property
+    def num_entries(self):
+        """
+        Number of entries in the lookup table.
+        """
+
+        return self._num_entries
+
+    def _buffers(self,shape):
+        """
+        Scratch buffers for converting values to table indexes.  These are
+        kept between calls so steady-state frames do not allocate.
+        """
+
+        if self._index is None or self._index.shape != shape:
+            self._scaled = np.zeros(shape,dtype=float)
+            self._index = np.zeros(shape,dtype=np.intp)
+
+        return self._scaled, self._index
+
+    def apply(self,values,out=None):
+        """
+        Colorize values.  Floating point values are treated as lying between 0
+        and 1; integer values are used directly as table indexes.  Boolean
+        values map to the two ends of the colormap.  Values
+        outside the table are clipped.  Returns an array with shape
+        values.shape + (4,) holding uint8 RGBA values.  If out is given, the
+        colors are written there.
+        """
+
+        values = np.asarray(values)
+        scaled, index = self._buffers(values.shape)
+
+        if values.dtype == bool:
+            np.copyto(index,values)
+            np.multiply(index,self._num_entries - 1,out=index)
+        elif np.issubdtype(values.dtype,np.integer):
+            np.copyto(index,values,casting="unsafe")
+        else:
+            np.multiply(values,self._num_entries - 1,out=scaled)
+            np.rint(scaled,out=scaled)
+            np.copyto(index,scaled,casting="unsafe")
+
+        if out is None:
+            out = np.zeros(values.shape + (4,),dtype=np.uint8)
+
+        np.take(self._table,index,axis=0,out=out,mode="clip")
+
+        return out
@@ -0,0 +1,252 @@
+__description__ = \
+"""
+Composite several generators, each drawing on its own rectangle of the
+display, into one frame.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .generators import advance, takes_out
+
+class Region:
+    """
+    Description of one rectangle of a composited frame and the generator that
+    draws it.
+    """
+
+    def __init__(self,generator,offset,shape,config={},plot_config=None,
+                 every=1):
+        """
+        generator: generator class (as for ArtInstallation) for this region.
+        offset: (x,y) position of the region's top-left corner in the frame.
+        shape: (x,y) size of the region.  The generator's .as_rgba() must
+               return frames of this size.
+        config: dictionary passed as **kwargs to the generator __init__.
+        plot_config: dictionary passed as **kwargs to .as_rgba.  If None, the
+                     plot config given to Compositor.as_rgba is used.
+        every: the generator is iterated (and redrawn) once every this many
+               iterations of the compositor.
+        """
+
+        self.generator = generator
+        self.offset = tuple([int(v) for v in offset])
+        self.shape = tuple([int(v) for v in shape])
+        self.config = dict(config)
+        self.plot_config = plot_config
+        self.every = int(every)
+
+        if len(self.offset) != 2 or len(self.shape) != 2:
+            err = "offset and shape must have 2 dimensions.\n"
+            raise ValueError(err)
+
+        if min(self.offset) < 0 or min(self.shape) < 1:
+            err = "offset must be >= 0 and shape must be >= 1.\n"
+            raise ValueError(err)
+
+        if self.every < 1:
+            err = "every must be an integer >= 1.\n"
+            raise ValueError(err)
+
+    @property
+    def slices(self):
+        """
+        Slices selecting this region of a frame.
+        """
+
+        return (slice(self.offset[0],self.offset[0] + self.shape[0]),
+                slice(self.offset[1],self.offset[1] + self.shape[1]))
+
+    def __repr__(self):
+
+        name = getattr(self.generator,"__qualname__",repr(self.generator))
+
+        return "Region({},{},{},{},{},{})".format(name,self.offset,self.shape,
+                                                 sorted(self.config.items()),
+                                                 self.plot_config,self.every)
+
+
+class Compositor:
+    """
+    Generator that runs one generator per Region and composites their output
+    into a single frame.  Regions that are due are iterated, and then
+    redrawn, concurrently on a thread pool (numpy releases the GIL for most of
+    the work); each writes directly into its slice of a shared frame.
+    Regions that did not tick keep their pixels, so they cost nothing (and
+    the Display skips their panels).
+
+    To use with ArtInstallation, pass Compositor as the generator and give
+    the regions in the generator configs, e.g.
+
+        {"x_size":64,"y_size":64,
+         "regions":[Region(Life,(0,0),(64,32),{"x_size":64,"y_size":32}),
+                    Region(Life,(0,32),(64,32),{"x_size":64,"y_size":32},
+                           every=2)]}
+    """
+
+    def __init__(self,x_size,y_size,regions,max_workers=None):
+        """
+        x_size, y_size: size of the composited frame.
+        regions: list of Region instances.  Regions must lie inside the frame
+                 and must not overlap.  Pixels not in any region are black.
+        max_workers: number of threads to use (default: one per region).
+        """
+
+        self._x_size = int(x_size)
+        self._y_size = int(y_size)
+        self._regions = list(regions)
+        if len(self._regions) == 0:
+            err = "A Compositor needs at least one region.\n"
+            raise ValueError(err)
+
+        # Check that regions fit and do not overlap
+        coverage = np.zeros((self._x_size,self._y_size),dtype=int)
+        for r in self._regions:
+            if r.offset[0] + r.shape[0] > self._x_size or \
+               r.offset[1] + r.shape[1] > self._y_size:
+                err = "{} does not fit in a ({},{}) frame.\n"
+                raise ValueError(err.format(r,self._x_size,self._y_size))
+            coverage[r.slices] += 1
+
+        if np.max(coverage) > 1:
+            err = "Regions must not overlap.\n"
+            raise ValueError(err)
+
+        self._max_workers = max_workers
+        if self._max_workers is None:
+            self._max_workers = len(self._regions)
+        self._executor = None
+
+        self._iterators = [r.generator(**r.config) for r in self._regions]
+        self._takes_out = [takes_out(i.as_rgba) for i in self._iterators]
+
+        self._frame = np.zeros((self._x_size,self._y_size,4),dtype=np.uint8)
+        self._frame[:,:,3] = 255
+        self._ticks = 0
+        self._dirty = [True for r in self._regions]
+        self._plot_config = None
+
+    def _map(self,function,indexes):
+        """
+        Call function(i) for each index, concurrently if there is more than
+        one.
+        """
+
+        if len(indexes) == 1:
+            function(indexes[0])
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self._max_workers)
+
+        for f in [self._executor.submit(function,i) for i in indexes]:
+            f.result()
+
+    def _due(self,num_steps):
+        """
+        Return how many times each region ticks in the next num_steps
+        iterations.
+        """
+
+        return [(self._ticks + num_steps)//r.every - self._ticks//r.every
+                for r in self._regions]
+
+    def iterate(self):
+        """
+        Iterate the generators of regions that are due.
+        """
+
+        due = [i for i, n in enumerate(self._due(1)) if n > 0]
+        self._ticks += 1
+
+        if len(due) > 0:
+            self._map(lambda i: self._iterators[i].iterate(),due)
+            for i in due:
+                self._dirty[i] = True
+
+    def iterate_many(self,n):
+        """
+        Advance n iterations, advancing each region's generator as many times
+        as it would have ticked (in one batched call if it supports
+        .iterate_many()).
+        """
+
+        counts = self._due(n)
+        self._ticks += int(n)
+
+        due = [i for i, c in enumerate(counts) if c > 0]
+        if len(due) > 0:
+            self._map(lambda i: advance(self._iterators[i],counts[i]),due)
+            for i in due:
+                self._dirty[i] = True
+
+    def _render(self,i):
+        """
+        Draw region i into its slice of the frame.
+        """
+
+        region = self._regions[i]
+        plot_config = region.plot_config
+        if plot_config is None:
+            plot_config = self._plot_config
+
+        target = self._frame[region.slices]
+        if self._takes_out[i]:
+            rgba = self._iterators[i].as_rgba(out=target,**plot_config)
+        else:
+            rgba = self._iterators[i].as_rgba(**plot_config)
+
+        if rgba is not target:
+            rgba = np.asarray(rgba)
+            if rgba.shape[:2] != region.shape:
+                err = "{} generator returned a {} frame.\n".format(region,
+                                                                   rgba.shape)
+                raise ValueError(err)
+            target[:,:,:rgba.shape[2]] = rgba
+
+    def as_rgba(self,out=None,**plot_config):
+        """
+        Return the composited frame, redrawing only regions that ticked (or
+        that use plot_config, if it changed).  plot_config is passed to
+        regions without a plot config of their own.  If out is given, the
+        frame is copied there; otherwise a copy is returned.
+        """
+
+        if plot_config != self._plot_config:
+            self._plot_config = dict(plot_config)
+            for i, r in enumerate(self._regions):
+                if r.plot_config is None:
+                    self._dirty[i] = True
+
+        dirty = [i for i, d in enumerate(self._dirty) if d]
+        if len(dirty) > 0:
+            self._map(self._render,dirty)
+            for i in dirty:
+                self._dirty[i] = False
+
+        if out is None:
+            return self._frame.copy()
+
+        np.copyto(out,self._frame)
+
+        return out
+
+    def close(self):
+        """
+        Shut down the thread pool.
+        """
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __getstate__(self):
+
+        # Thread pools cannot be pickled; a new one is made when needed
+        state = self.__dict__.copy()
+        state["_executor"] = None
+
+        return state
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+__description__ = \
+"""
+Display daemon that owns the LED panels.  The art process writes chain frames
+into a double-buffered shared memory segment (see SharedMemoryBackend); this
+daemon swaps the newest complete frame onto the panels, so refresh timing is
+not affected by garbage collection or heavy numpy work in the art process.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+__usage__ = "python -m ledsart.daemon rows chain_length [--name ledsart] [--parallel 1] [--brightness 40]"
+
+import os, sys, time, argparse
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+# Layout of the int64 header at the start of the segment
+_MAGIC = 0x4c454453415255
+_HEADER = ("magic","rows","columns","sequence","active","slot_0","slot_1","closed",
+           "writer")
+_HEADER_BYTES = 8*len(_HEADER)
+
+class SharedFrameBuffer:
+    """
+    Two (rows,columns,4) uint8 RGBX frame slots in a shared memory segment,
+    with a header holding a frame sequence counter, the index of the newest
+    complete slot and a per-slot sequence counter.  The writer fills the slot
+    that is not active, bumping its counter to odd before writing and to even
+    after, then makes it active.  A reader copies the active slot and keeps
+    the copy only if the slot's counter was even and unchanged, so it never
+    shows a half-written frame.  The header also records the pid of the
+    writer, so readers can tell when a writer died without closing the
+    buffer.  Writer and readers must share a pid namespace.
+    """
+
+    def __init__(self,name,rows=None,columns=None,create=False):
+        """
+        Create or attach to a shared frame buffer.
+
+        name: name of the shared memory segment.
+        rows, columns: shape of each frame (required if create is True).
+        create: if True, create the segment (replacing a segment left behind
+                by a writer that exited or closed it); otherwise attach to
+                an existing one.  Raises FileExistsError if another live
+                writer is using the name.
+        """
+
+        self.name = name
+        self._owner = bool(create)
+
+        if create:
+            if rows is None or columns is None:
+                err = "rows and columns must be given to create a buffer.\n"
+                raise ValueError(err)
+            self._shm = self._create(name,_HEADER_BYTES + 2*int(rows)*int(columns)*4)
+        else:
+            self._shm = self._attach(name)
+
+        self._header = np.ndarray(len(_HEADER),dtype=np.int64,buffer=self._shm.buf)
+
+        if create:
+            self._header[:] = 0
+            self._header[_HEADER.index("rows")] = rows
+            self._header[_HEADER.index("columns")] = columns
+            self._header[_HEADER.index("writer")] = os.getpid()
+            self._header[_HEADER.index("magic")] = _MAGIC
+
+        if self._header[_HEADER.index("magic")] != _MAGIC:
+            err = "shared memory segment {} is not a frame buffer.\n".format(name)
+            raise ValueError(err)
+
+        self.rows = int(self._header[_HEADER.index("rows")])
+        self.columns = int(self._header[_HEADER.index("columns")])
+        if (rows is not None and rows != self.rows) or \
+           (columns is not None and columns != self.columns):
+            err = "shared frame buffer {} has shape ({},{}), not ({},{}).\n"
+            raise ValueError(err.format(name,self.rows,self.columns,rows,columns))
+
+        shape = (2,self.rows,self.columns,4)
+        self._slots = np.ndarray(shape,dtype=np.uint8,buffer=self._shm.buf,
+                                 offset=_HEADER_BYTES)
+        self._slots_seen = -1
+        self._writer = int(self._header[_HEADER.index("writer")])
+
+    def _create(self,name,size):
+        """
+        Create a segment, first removing any segment of the same name whose
+        writer has closed it or died.
+        """
+
+        try:
+            return shared_memory.SharedMemory(name=name,create=True,size=size)
+        except FileExistsError:
+            pass
+
+        # Attach with tracking, as this process takes the segment over (and
+        # so should remove it on exit) if it is stale
+        stale = shared_memory.SharedMemory(name=name)
+        try:
+            header = np.ndarray(len(_HEADER),dtype=np.int64,buffer=stale.buf)
+            in_use = header[_HEADER.index("magic")] == _MAGIC and \
+                     not header[_HEADER.index("closed")] and \
+                     _process_alive(int(header[_HEADER.index("writer")]))
+            writer = int(header[_HEADER.index("writer")])
+            del header
+        finally:
+            stale.close()
+
+        if in_use:
+            # Leave segments of other processes (and this process' own
+            # registration of its segments) alone
+            if writer != os.getpid():
+                _untrack(stale)
+            err = "shared memory segment {} is in use by process {}.  Give each\n"
+            err += "display its own segment name.\n"
+            raise FileExistsError(err.format(name,writer))
+
+        try:
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+        return shared_memory.SharedMemory(name=name,create=True,size=size)
+
+    def _attach(self,name):
+        """
+        Attach to an existing segment without registering it with this
+        process' resource tracker, which would otherwise unlink it when this
+        process exits.
+        """
+
+        try:
+            return shared_memory.SharedMemory(name=name,track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+
+            # The tracker keeps one registration per name, so leave it if
+            # this process is also the writer
+            writer = 0
+            if shm.size >= _HEADER_BYTES:
+                header = np.ndarray(len(_HEADER),dtype=np.int64,buffer=shm.buf)
+                if header[_HEADER.index("magic")] == _MAGIC:
+                    writer = int(header[_HEADER.index("writer")])
+                del header
+
+            if writer != os.getpid():
+                _untrack(shm)
+
+            return shm
+
+    @property
+    def sequence(self):
+        """
+        Number of frames written so far.
+        """
+
+        return int(self._header[_HEADER.index("sequence")])
+
+    @property
+    def closed(self):
+        """
+        Whether the writer has closed the buffer.
+        """
+
+        return bool(self._header[_HEADER.index("closed")])
+
+    @property
+    def writer_alive(self):
+        """
+        Whether the process that created the buffer is still running (and
+        has not been replaced by a new writer).
+        """
+
+        writer = int(self._header[_HEADER.index("writer")])
+
+        return writer == self._writer and _process_alive(writer)
+
+    def write(self,matrix):
+        """
+        Write a (rows,columns,4) uint8 frame into the inactive slot and make
+        it the active one.
+        """
+
+        active = _HEADER.index("active")
+        slot = 1 - int(self._header[active])
+        counter = _HEADER.index("slot_{}".format(slot))
+
+        self._header[counter] += 1
+        self._slots[slot][...] = matrix
+        self._header[counter] += 1
+
+        self._header[active] = slot
+        self._header[_HEADER.index("sequence")] += 1
+
+    def read(self,out):
+        """
+        Copy the newest complete frame into out if there is a frame newer than
+        the last one read.  Returns True if out was updated.
+        """
+
+        sequence = int(self._header[_HEADER.index("sequence")])
+        if sequence == self._slots_seen or sequence == 0:
+            return False
+
+        slot = int(self._header[_HEADER.index("active")])
+        counter = _HEADER.index("slot_{}".format(slot))
+
+        before = int(self._header[counter])
+        if before % 2 == 1:
+            return False
+
+        np.copyto(out,self._slots[slot])
+
+        if int(self._header[counter]) != before:
+            return False
+
+        self._slots_seen = sequence
+
+        return True
+
+    def close(self):
+        """
+        Detach from the segment.  The process that created it also marks it
+        closed (so the daemon stops) and removes it.
+        """
+
+        if self._shm is None:
+            return
+
+        if self._owner:
+            self._header[_HEADER.index("closed")] = 1
+
+        self._header = None
+        self._slots = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
+
+
+def _untrack(shm):
+    """
+    Stop this process' resource tracker from removing a segment on exit.
+    """
+
+    try:
+        resource_tracker.unregister(shm._name,"shared_memory")
+    except Exception:
+        pass
+
+
+def _process_alive(pid):
+    """
+    Whether a process with this pid is running.
+    """
+
+    if pid <= 0:
+        return False
+
+    try:
+        os.kill(pid,0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+def run_daemon(name,rows,chain_length,num_parallel=1,pwmbits=11,brightness=40,
+               corr_luminance=True,poll_interval=0.001,persist=True,
+               backend=None):
+    """
+    Show frames from the shared frame buffer name on the panels.
+
+    name: name of the shared memory segment.
+    rows, chain_length, num_parallel, pwmbits, brightness, corr_luminance:
+        passed to RgbmatrixBackend.
+    poll_interval: how long (in seconds) to sleep between checks for a new
+                   frame (or for the segment to be created).
+    persist: if True, keep running when the writer closes the buffer (or
+             exits without closing it) and wait for a new one (so the art process can be restarted without
+             restarting the daemon).  Otherwise, return.
+    backend: Backend instance to draw with.  If None, an RgbmatrixBackend is
+             created.
+    """
+
+    if backend is None:
+        from .display import RgbmatrixBackend
+        backend = RgbmatrixBackend(rows,chain_length,num_parallel,
+                                   pwmbits,brightness,corr_luminance)
+
+    while True:
+
+        # Wait for the art process to create the segment
+        try:
+            frames = SharedFrameBuffer(name)
+        except FileNotFoundError:
+            time.sleep(max(poll_interval,0.1))
+            continue
+
+        try:
+            matrix = np.zeros((frames.rows,frames.columns,4),dtype=np.uint8)
+            while not frames.closed and frames.writer_alive:
+                if frames.read(matrix):
+                    backend.draw(matrix)
+                else:
+                    time.sleep(poll_interval)
+        finally:
+            frames.close()
+
+        if not persist:
+            return
+
+        # Give the writer (or, if it died, its resource tracker) time to
+        # remove the segment
+        time.sleep(max(poll_interval,0.1))
+
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument("rows",type=int,help="rows in each panel")
+    parser.add_argument("chain_length",type=int,help="number of chained panels")
+    parser.add_argument("--name",default="ledsart",
+                        help="name of the shared memory segment")
+    parser.add_argument("--parallel",type=int,default=1,
+                        help="number of parallel chains")
+    parser.add_argument("--pwmbits",type=int,default=11)
+    parser.add_argument("--brightness",type=int,default=40)
+    parser.add_argument("--no-luminance-correction",action="store_true")
+    args = parser.parse_args(argv)
+
+    try:
+        run_daemon(args.name,args.rows,args.chain_length,args.parallel,
+                   args.pwmbits,args.brightness,
+                   not args.no_luminance_correction)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,9 @@ Drive a set of LED matrix panels.
 __author__ = "Michael J. Harms"
 __date__ = "2017-01-01"
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 class Panel:
@@ -15,12 +18,20 @@ class Panel:
     def __init__(self,x_size=32,y_size=32):
         """
         Initialize an instance of Panel.
+
+        x_size: number of image rows the panel covers.
+        y_size: number of image columns the panel covers.  Panels in one
+                display can have different sizes; an unrotated 64 wide by 32
+                tall panel is Panel(32,64).
         """
 
         self._shape = (x_size,y_size)
         self._offset = (0,0)
         self._chain_offset = 0 
+        self._chain_row = 0
+        self._rotation = 0
         self._transform_function = None
+        self._calibration = None
 
     @property
     def shape(self):
@@ -63,6 +74,78 @@ class Panel:
 
         self._chain_offset = chain_offset
 
+    @property
+    def chain_row(self):
+        """
+        Which parallel chain the panel is on (0 for a single chain).
+        """
+        return self._chain_row
+
+    @chain_row.setter
+    def chain_row(self,chain_row):
+
+        if type(chain_row) != int:
+            err = "Chain row must be an integer.\n"
+            raise ValueError(err)
+
+        self._chain_row = chain_row
+
+    @property
+    def chain_shape(self):
+        """
+        The (rows,columns) the panel takes up in the chain: its shape after
+        rotation.
+        """
+
+        if self._rotation in (90,270):
+            return (self._shape[1],self._shape[0])
+
+        return self._shape
+
+    @property
+    def calibration(self):
+        """
+        Color calibration lookup table for the panel: a (3,256) uint8 array
+        mapping each red, green and blue value to the value actually sent to
+        the panel.  None if the panel is not calibrated.
+        """
+
+        return self._calibration
+
+    @calibration.setter
+    def calibration(self,calibration):
+
+        if calibration is None:
+            self._calibration = None
+            return
+
+        calibration = np.asarray(calibration)
+        if calibration.shape != (3,256):
+            err = "Calibration must have shape (3,256).\n"
+            raise ValueError(err)
+
+        self._calibration = np.clip(np.round(calibration),0,255).astype(np.uint8)
+
+    def set_calibration(self,gamma=1.0,white_balance=(1.0,1.0,1.0),
+                        brightness=1.0):
+        """
+        Build the color calibration lookup table for this panel.  Each channel
+        value v becomes 255*brightness*white_balance*(v/255)**gamma.
+
+        gamma: gamma correction exponent.
+        white_balance: relative scale of the red, green and blue channels.
+        brightness: overall scale (0 to 1) of the panel.
+        """
+
+        if len(white_balance) != 3:
+            err = "White balance must have 3 (RGB) values.\n"
+            raise ValueError(err)
+
+        v = np.arange(256)/255.0
+        scale = brightness*np.array(white_balance,dtype=float)[:,np.newaxis]
+
+        self.calibration = 255*scale*v[np.newaxis,:]**gamma
+
     def _r90(self,m):
         """
         Rotate by 90 degrees.
@@ -94,6 +177,7 @@ class Panel:
                    270:self._r270}
 
         self._transform_function = options[transform_key]
+        self._rotation = transform_key
 
     def transform(self,some_matrix):
         """
@@ -115,31 +199,71 @@ class Display:
     panels.
     """
 
-    def __init__(self,layout,chain,rotation=(),backend="rgbmatrix"):
+    def __init__(self,layout,chain,rotation=(),backend="rgbmatrix",
+                 skip_unchanged=True,fit="scale",resample="nearest"):
         """
         
         layout: a 2D array (or 2D list) of Panel instaces indicating their
                 arrangement in space.
         chain:  a 1D array that has all Panel instances in layout indicating
-                how the panels are actually wired together as a chain.
-        rotation: a 1D array indicating the rotation to apply to each panel.
+                how the panels are actually wired together as a chain.  For
+                parallel chains, a 2D array with one row per chain (all the
+                same length).  Parallel chains are stacked top to bottom in
+                the matrix handed to the backend.
+        rotation: an array with the same number of entries as chain
+                  indicating the rotation to apply to each panel.
         backend: how to plot.  rgbmatrix will use the rgbmatrix library to 
-                 draw on LED panels.  matplotlib will use matplotlib to plot
-                 on a graph. 
+                 draw on LED panels.  shared_memory will hand frames to a
+                 display daemon (see ledsart.daemon) that draws them,
+                 through a segment named "ledsart" ("ledsart_0", ... for a
+                 list of backends); to run several such displays, give each
+                 a SharedMemoryBackend instance with its own name.
+                 matplotlib will use matplotlib to plot on a graph.  null
+                 does not draw anything (useful for benchmarking).  A Backend
+                 instance can also be given.  For parallel chains, this can
+                 also be a list with one backend per chain; each is handed
+                 its own band of the matrix, and the backends of changed
+                 bands are drawn concurrently.  Lists are meant for
+                 shared_memory, null or Backend instances: rgbmatrix drives
+                 all parallel chains from one matrix per process, so give
+                 backend="rgbmatrix" (not a list) for parallel chains on
+                 panels.
+        skip_unchanged: compare each frame to the one currently displayed.
+                        Only panels that changed are copied into the chain
+                        and the backend is not called at all if nothing
+                        changed.
+        fit: how to show images whose size differs from the display.
+             "scale" stretches them to fill the display, "crop" scales them
+             (keeping their aspect ratio) to cover the display and cuts off
+             what does not fit, and "letterbox" scales them to fit inside the
+             display with black bars.  If None, images must match the size
+             of the display exactly.
+        resample: "nearest" takes the nearest image pixel; "box" averages the
+                  image pixels that fall on each display pixel (useful when
+                  shrinking large images).
         """
        
         self._layout = np.array(layout)
-        self._chain = np.array(chain)
+        self._chains = np.array(chain)
+        rotation = list(np.ravel(np.array(rotation,dtype=object)))
 
         # -------------- Do a bunch of sanity checks --------------------
         if len(self._layout.shape) != 2:
             err = "Layout must be a 2D array!\n"
             raise ValueError(err)
 
-        if len(self._chain.shape) != 1:
-            err = "Chain must be a 1D array!\n"
+        if len(self._chains.shape) == 1:
+            self._chains = self._chains[np.newaxis,:]
+
+        if len(self._chains.shape) != 2:
+            err = "Chain must be a 1D or 2D array!\n"
             raise ValueError(err)
 
+        # All panels, in chain order (parallel chain by parallel chain)
+        self._chain = np.ravel(self._chains)
+        self._num_parallel = self._chains.shape[0]
+        self._chain_length = self._chains.shape[1]
+
         chain_dict = dict([(c,0) for c in self._chain])
         if len(chain_dict.keys()) != self._chain.shape[0]:
             err = "Chain entries must be unique!\n"
@@ -162,71 +286,425 @@ class Display:
             raise ValueError(err)
 
 
-        x_dims = []
-        y_dims = []
-        for s in self._chain:
-            x_dims.append(s.shape[0])
-            y_dims.append(s.shape[1])
-   
-        if len(np.unique(x_dims)) != 1 or len(np.unique(y_dims)) != 1:
-            err = "Sub panels must all have the same dimensions.\n"
-            raise ValueError(err)
-
         # -------------- End sanity checks --------------------
 
-        # Record size of each subpanel
-        self._subpanel_x_size = self._chain[0].shape[0]
-        self._subpanel_y_size = self._chain[0].shape[1]
-    
+        for i, s in enumerate(self._chain):
+            if len(rotation) != 0:
+                s.set_transform_function(rotation[i])
+
+        # Panels can have different sizes.  Each row of the layout is as tall
+        # as its tallest panel and each column as wide as its widest; panels
+        # smaller than their cell sit in its top-left corner.
+        row_sizes = [max([p.shape[0] for p in self._layout[i,:]])
+                     for i in range(self._layout.shape[0])]
+        column_sizes = [max([p.shape[1] for p in self._layout[:,j]])
+                        for j in range(self._layout.shape[1])]
+
         # Figure out the total size of the panel 
-        self._total_x_size = sum([p.shape[0] for p in self._layout[:,0]])
-        self._total_y_size = sum([p.shape[1] for p in self._layout[0,:]])
+        self._total_x_size = sum(row_sizes)
+        self._total_y_size = sum(column_sizes)
 
         # Figure out offsets for the coordinates of each panel, mapping them to 
         # the global coordinates. This uses the top-left corner as the origin. 
-        x_offset = 0
-        y_offset = 0
+        x_offsets = np.cumsum([0] + row_sizes[:-1])
+        y_offsets = np.cumsum([0] + column_sizes[:-1])
         for i in range(self._layout.shape[0]):
             for j in range(self._layout.shape[1]):
-                self._layout[i,j].offset = [x_offset,y_offset]
-                y_offset += self._subpanel_y_size
-            y_offset = 0
-            x_offset += self._subpanel_x_size
+                self._layout[i,j].offset = [int(x_offsets[i]),int(y_offsets[j])]
 
-        # Figure out where to place each panel in the chain
-        chain_offset = 0 
-        for i, s in enumerate(self._chain):
-            s.chain_offset = chain_offset
-            chain_offset += s.shape[0]
+        # Figure out where to place each panel in the chain.  Each panel
+        # takes up as many columns as it is wide (after rotation).
+        band_widths = []
+        for j in range(self._num_parallel):
+            chain_offset = 0 
+            for s in self._chains[j]:
+                s.chain_offset = chain_offset
+                s.chain_row = j
+                chain_offset += s.chain_shape[1]
+            band_widths.append(chain_offset)
 
-            if len(rotation) != 0:
-                s.set_transform_function(rotation[i])
+        # The chain is stored as a contiguous uint8 RGBX buffer that is reused
+        # for every frame and can be handed straight to the backend.  The
+        # fourth (X) channel is padding and should be ignored.  Parallel
+        # chains are stacked as bands of rows, each as tall as the tallest
+        # panel.  Chain pixels not covered by a panel (below short panels or
+        # past the end of a short chain) are always black.
+        self._band_rows = max([s.chain_shape[0] for s in self._chain])
+        self._chain_matrix = np.zeros((self._band_rows*self._num_parallel,
+                                       max(band_widths),4),dtype=np.uint8)
+
+        covered = np.zeros(self._chain_matrix.shape[:2],dtype=bool)
+        for s in self._chain:
+            rows, columns = s.chain_shape
+            row_0 = s.chain_row*self._band_rows
+            covered[row_0:row_0 + rows,
+                    s.chain_offset:s.chain_offset + columns] = True
+        self._uncovered = None
+        if not np.all(covered):
+            self._uncovered = np.repeat(np.logical_not(covered)[:,:,np.newaxis],
+                                        4,axis=2)
+
+        self._staging_buffers = {}
+
+        # Precompute where each pixel in the chain comes from in the image.
+        # This lets draw() do the layout, chain and rotation step as a single
+        # gather rather than looping over panels.
+        if fit not in (None,"scale","crop","letterbox"):
+            err = "fit must be None, 'scale', 'crop' or 'letterbox'.\n"
+            raise ValueError(err)
+        if resample not in ("nearest","box"):
+            err = "resample must be 'nearest' or 'box'.\n"
+            raise ValueError(err)
+        self._fit = fit
+        self._resample = resample
+
+        self._source_shape = (self._total_x_size,self._total_y_size)
+        self._source_offset = (0,0)
+        self._pixel_map = self._build_pixel_map()
+        self._gather_maps = {}
+        self._box_buffers = {}
+
+        # Record which columns of each band belong to which panel, so changed
+        # pixels can be reduced to changed panels in one pass.  Bands are
+        # handled as one long row of columns, so bands of different widths
+        # need no special treatment; unused columns at the end of a band are
+        # never changed and are lumped in with its last panel.
+        self._skip_unchanged = bool(skip_unchanged)
+        num_columns = self._chain_matrix.shape[1]
+        self._panel_starts = np.array([s.chain_row*num_columns + s.chain_offset
+                                       for s in self._chain])
+        panel_widths = np.diff(np.append(self._panel_starts,
+                                         self._num_parallel*num_columns))
+        self._column_panel = np.repeat(np.arange(len(self._chain)),panel_widths)
+        self._changed_pixels = np.zeros(self._chain_matrix.shape[:2],dtype=bool)
+        self._changed_columns = np.zeros((self._num_parallel,num_columns),
+                                         dtype=bool)
+        self._changed_panels = np.zeros((self._num_parallel,self._chain_length),
+                                        dtype=bool)
+        self._changed_bands = np.ones(self._num_parallel,dtype=bool)
+
+        # Index (in chain order) of the panel each chain pixel belongs to
+        column_panel = self._column_panel.reshape((self._num_parallel,num_columns))
+        self._pixel_panel = np.repeat(column_panel,self._band_rows,axis=0)
+
+        self._force_draw = True
+        self._map_ns = 0
+        self._backend_ns = 0
+        self._frames_skipped = 0
+        self._panels_skipped = 0
+
+        self.update_calibration()
+
+        # Deal with graphical backend(s).  Each backend is paired with the
+        # part of the chain matrix it draws.
+        self._backend_executor = None
+        if isinstance(backend,(list,tuple)):
+            if len(backend) != self._num_parallel:
+                err = "There must be one backend per parallel chain.\n"
+                raise ValueError(err)
 
-        self._chain_matrix = np.zeros((self._subpanel_y_size,
-                                       len(self._chain)*self._subpanel_x_size,
-                                       3),dtype=np.int)
+            if any([isinstance(b,RgbmatrixBackend) or \
+                    (isinstance(b,str) and b == "rgbmatrix") for b in backend]):
+                err = "rgbmatrix cannot be given per chain: it allows one matrix\n"
+                err += "per process, which drives all parallel chains.  Use\n"
+                err += "backend=\"rgbmatrix\" instead.\n"
+                raise ValueError(err)
+
+            self._backends = []
+            for j, b in enumerate(backend):
+                band = self._chain_matrix[j*self._band_rows:(j+1)*self._band_rows]
+                self._backends.append((self._make_backend(b,1,j),band))
+        else:
+            self._backends = [(self._make_backend(backend,self._num_parallel),
+                               self._chain_matrix)]
+
+    def _make_backend(self,backend,num_parallel,band=None):
+        """
+        Return a backend instance, creating it from its name if necessary.
+        band is the parallel chain it will draw (None if it draws them all).
+        """
+
+        if isinstance(backend,Backend):
+            return backend
+
+        rows = self._band_rows*num_parallel
+        columns = self._chain_matrix.shape[1]
 
-        # Deal with graphical backend
         if backend == "rgbmatrix":
-            self._backend = RgbmatrixBackend(self._subpanel_y_size,
-                                             len(self._chain),1)
+            # rgbmatrix expects a chain of identical panels, so describe
+            # mixed panels (e.g. 32 and 64 wide) as a chain of the largest
+            # panel width that divides them all.
+            widths = [s.chain_shape[1] for s in self._chain]
+            chain_length = columns//int(np.gcd.reduce(widths))
+            return RgbmatrixBackend(self._band_rows,chain_length,num_parallel)
+        elif backend == "shared_memory":
+            name = "ledsart"
+            if band is not None:
+                name = "ledsart_{}".format(band)
+            return SharedMemoryBackend(rows,columns,name)
         elif backend == "matplotlib":
-            self._backend = MatplotlibBackend()
+            return MatplotlibBackend()
+        elif backend == "null":
+            return Backend()
+
+        err = "backend {} not recognized.\n".format(backend)
+        raise ValueError(err)
+
+
+    def _build_pixel_map(self):
+        """
+        Build a 2D array with the same shape as the chain holding the flat
+        index of the image pixel that ends up at each chain position.  This is
+        done by running the per-panel mapping and rotation once on an image
+        of pixel indexes.  Chain pixels not covered by a panel map to 0 (and
+        are blacked out when drawing).  Indexes are into the source image (see
+        .set_source()).
+        """
+
+        source_x, source_y = self._source_shape
+        offset_x, offset_y = self._source_offset
+
+        pixel_index = np.arange(source_x*source_y).reshape((source_x,source_y))
+        pixel_index = pixel_index[offset_x:offset_x + self._total_x_size,
+                                  offset_y:offset_y + self._total_y_size]
+
+        pixel_map = np.zeros(self._chain_matrix.shape[:2],dtype=np.intp)
+        for i, s in enumerate(self._chain):
+
+            chain_x_0 = s.chain_row*self._band_rows
+            chain_x_1 = chain_x_0 + s.chain_shape[0]
+            chain_y_0 = s.chain_offset
+            chain_y_1 = s.chain_offset + s.chain_shape[1]
+
+            image_x_0 = s.offset[0]
+            image_x_1 = s.offset[0] + s.shape[0]
+
+            image_y_0 = s.offset[1]
+            image_y_1 = s.offset[1] + s.shape[1]
+
+            # Map and rotate
+            pixel_map[chain_x_0:chain_x_1,
+                      chain_y_0:chain_y_1] = \
+                      s.transform(pixel_index[image_x_0:image_x_1,
+                                              image_y_0:image_y_1])
+
+        return pixel_map
+
+    def _gather_map(self,image_shape):
+        """
+        Return indexes into a flattened image with image_shape that fill the
+        RGBX channels of the chain, and a mask of chain pixels that should be
+        black (letterboxing, or not covered by a panel) or None.  The padding
+        channel is filled with the blue channel of the image so the whole
+        chain can be written in one contiguous copy.  For box resampling, the indexes have an extra axis
+        of image pixels to average.  These are cached by image shape, so are
+        only calculated once for each size of image.
+        """
+
+        key = tuple(image_shape[:3])
+        try:
+            return self._gather_maps[key]
+        except KeyError:
+            pass
+
+        x_size, y_size, num_channels = key
+        if (x_size,y_size) == self._source_shape:
+            pixel_map = self._pixel_map[:,:,np.newaxis]
+            padding = None
         else:
-            err = "backend {} not recognized.\n".format(backend)
-            raise ValueError(err)
+            pixel_map, padding = self._resample_map(x_size,y_size)
+
+        if self._uncovered is not None:
+            if padding is None:
+                padding = self._uncovered
+            else:
+                padding = np.logical_or(padding,self._uncovered)
+
+        channels = np.array([0,1,2,2])
+        gather_map = pixel_map[...,np.newaxis]*num_channels + channels
+        if gather_map.shape[2] == 1:
+            gather_map = gather_map[:,:,0]
+
+        self._gather_maps[key] = (np.ascontiguousarray(gather_map),padding)
+
+        return self._gather_maps[key]
+
+    def _axis_map(self,in_size,out_size,scale,taps):
+        """
+        Return an (out_size,taps) array with the image index sampled for each
+        display position along one axis, or -1 where it falls outside the
+        image.  The taps are spread evenly over the box of image pixels that
+        covers each display pixel, centered on the image.
+        """
+
+        start = (np.arange(out_size) - out_size/2)*scale + in_size/2
+        samples = start[:,np.newaxis] + (np.arange(taps) + 0.5)*scale/taps
+
+        index = np.floor(samples).astype(np.intp)
+        index[(index < 0) | (index >= in_size)] = -1
+
+        return index
+
+    def _resample_map(self,x_size,y_size):
+        """
+        Return the flat index of the (x_size,y_size) image pixel(s) that end
+        up at each chain position, with shape (rows,columns,taps), and a mask
+        of chain pixels that fall outside the image (or None).
+        """
+
+        if self._fit is None:
+            err = "Image dimensions ({},{}) do not match panel dimensions ({})\n"
+            raise ValueError(err.format(x_size,y_size,self._source_shape))
+
+        source_x, source_y = self._source_shape
+        scale_x = x_size/source_x
+        scale_y = y_size/source_y
+        if self._fit == "crop":
+            scale_x = scale_y = min(scale_x,scale_y)
+        elif self._fit == "letterbox":
+            scale_x = scale_y = max(scale_x,scale_y)
+
+        taps_x = taps_y = 1
+        if self._resample == "box":
+            taps_x = max(1,int(np.ceil(scale_x)))
+            taps_y = max(1,int(np.ceil(scale_y)))
+
+        index_x = self._axis_map(x_size,source_x,scale_x,taps_x)[self._pixel_map//source_y]
+        index_y = self._axis_map(y_size,source_y,scale_y,taps_y)[self._pixel_map % source_y]
+
+        # Pixels with no tap inside the image are black
+        inside = np.logical_and(np.any(index_x >= 0,axis=2),
+                                np.any(index_y >= 0,axis=2))
+        padding = None
+        if not np.all(inside):
+            padding = np.repeat(np.logical_not(inside)[:,:,np.newaxis],4,axis=2)
+
+        index_x = np.clip(index_x,0,x_size - 1)
+        index_y = np.clip(index_y,0,y_size - 1)
+        pixel_map = index_x[:,:,:,np.newaxis]*y_size + index_y[:,:,np.newaxis,:]
+
+        return pixel_map.reshape(pixel_map.shape[:2] + (-1,)), padding
+
+    def _box_filter(self,flat_image,gather_map,frame):
+        """
+        Gather several image pixels for each chain pixel and write their
+        (rounded) average into frame.  uint8 images are summed as integers,
+        which is much faster than a floating point mean.
+        """
+
+        num_taps = gather_map.shape[2]
+
+        key = (flat_image.dtype,gather_map.shape)
+        try:
+            taps, total = self._box_buffers[key]
+        except KeyError:
+            if flat_image.dtype == np.uint8:
+                total_dtype = np.uint16 if num_taps <= 257 else np.uint32
+            else:
+                total_dtype = float
+            taps = np.zeros(gather_map.shape,dtype=flat_image.dtype)
+            total = np.zeros(frame.shape,dtype=total_dtype)
+            self._box_buffers[key] = (taps,total)
+
+        np.take(flat_image,gather_map,out=taps,mode="clip")
+
+        # Summing tap by tap is faster than reducing over the taps axis
+        np.copyto(total,taps[:,:,0],casting="unsafe")
+        for i in range(1,num_taps):
+            np.add(total,taps[:,:,i],out=total,casting="unsafe")
+
+        if total.dtype.kind == "u":
+            np.add(total,num_taps//2,out=total,casting="unsafe")
+            np.floor_divide(total,num_taps,out=total)
+        else:
+            np.divide(total,num_taps,out=total)
+            np.rint(total,out=total)
 
+        np.copyto(frame,total,casting="unsafe")
+
+    def _staging_buffer(self,dtype):
+        """
+        Return a buffer with the shape of the chain and the given dtype.  Images
+        that are not uint8 are gathered into this before being cast into the
+        chain, which avoids allocating a temporary array on every frame.
+        """
+
+        try:
+            return self._staging_buffers[dtype]
+        except KeyError:
+            pass
+
+        self._staging_buffers[dtype] = np.zeros(self._chain_matrix.shape,
+                                                dtype=dtype)
+
+        return self._staging_buffers[dtype]
+
+    def set_source(self,shape,offset=(0,0)):
+        """
+        Draw a region of larger images.  After this, .draw() takes images with
+        shape (x,y,channels) and shows the part of them whose top-left corner
+        is at offset.  The region is read straight from the larger image by
+        the precomputed gather, so no copy of it is made.
+
+        shape: (x,y) shape of the images to draw.
+        offset: (x,y) position of this display's top-left corner in them.
+        """
+
+        shape = tuple([int(v) for v in shape[:2]])
+        offset = tuple([int(v) for v in offset])
+        if len(offset) != 2 or min(offset) < 0 or \
+           offset[0] + self._total_x_size > shape[0] or \
+           offset[1] + self._total_y_size > shape[1]:
+            err = "Display ({},{}) at offset {} does not fit in shape {}.\n"
+            raise ValueError(err.format(self._total_x_size,self._total_y_size,
+                                        offset,shape))
+
+        self._source_shape = shape
+        self._source_offset = offset
+        self._pixel_map = self._build_pixel_map()
+        self._gather_maps = {}
+        self._force_draw = True
+
+    @property
+    def shape(self):
+        """
+        Shape (x,y) of the images this display draws.
+        """
+
+        return self._source_shape
+
+    def frame_buffer(self):
+        """
+        Return a new (x,y,4) uint8 RGBA array with the shape of the images
+        this display draws.  Generators can render into buffers like this
+        (see the out argument of .as_rgba()) and hand them to .draw(), which
+        maps uint8 images without any conversion, so steady-state frames need
+        not allocate.
+        """
+
+        return np.zeros(self._source_shape + (4,),dtype=np.uint8)
 
     def draw(self,image):
         """
         Take a matrix of RGB values and draw them using the chosen backend.  
         Use the specified layout, chain, and rotation to plot each chunk of
         of the image on the appropriate panel with the appropriate orientation.
+        Images of other sizes are resampled as set by fit and resample.
+        """
+
+        if self._map(image):
+            self._present()
+
+    def _map(self,image):
+        """
+        Map an image into the chain.  Returns False if nothing changed (and
+        thus nothing needs to be drawn).
         """
 
         # Make sure the image has the correct dimensions
-        if image.shape[0] != self._total_x_size or image.shape[1] != self._total_y_size:
-            local_shape = (self._total_x_size,self._total_y_size)
+        if self._fit is None and \
+           (image.shape[0] != self._source_shape[0] or image.shape[1] != self._source_shape[1]):
+            local_shape = self._source_shape
             err = "Image dimensions ({}) do not match panel dimensions ({})\n".format(image.shape,
                                                                                       local_shape)
             raise ValueError(err)
@@ -236,33 +714,327 @@ class Display:
             err = "Image must have at least RGB channels\n"
             raise ValueError(err)
 
-        # Map the matrix into the chain 
-        for i, s in enumerate(self._chain):
+        start = time.perf_counter_ns()
 
-            chain_x_0 = 0
-            chain_x_1 = self._subpanel_y_size
-            chain_y_0 = s.chain_offset
-            chain_y_1 = s.chain_offset + self._subpanel_x_size
+        # If we are skipping unchanged panels, map into a staging buffer so
+        # the new frame can be compared to the one currently displayed.
+        if self._skip_unchanged:
+            frame = self._staging_buffer(np.uint8)
+        else:
+            frame = self._chain_matrix
 
-            image_x_0 = s.offset[0]
-            image_x_1 = s.offset[0] + self._subpanel_x_size
+        # Map (and, if need be, resample) the matrix into the chain in one
+        # vectorized copy
+        flat_image = np.ravel(image)
+        gather_map, padding = self._gather_map(image.shape)
+        if gather_map.ndim == 4:
+            self._box_filter(flat_image,gather_map,frame)
+        elif flat_image.dtype == np.uint8:
+            np.take(flat_image,gather_map,out=frame,mode="clip")
+        else:
+            staging = self._staging_buffer(flat_image.dtype)
+            np.take(flat_image,gather_map,out=staging,mode="clip")
+            np.copyto(frame,staging,casting="unsafe")
 
-            image_y_0 = s.offset[1]
-            image_y_1 = s.offset[1] + self._subpanel_y_size
+        if self._calibration_table is not None:
+            self._calibrate(frame)
 
-            # Map and rotate
-            self._chain_matrix[chain_x_0:chain_x_1,
-                               chain_y_0:chain_y_1,:3] = \
-                               s.transform(image[image_x_0:image_x_1,
-                                               image_y_0:image_y_1,:3])
+        if padding is not None:
+            np.copyto(frame,0,where=padding)
+
+        changed = not self._skip_unchanged or self._copy_changed_panels(frame)
+
+        self._map_ns = time.perf_counter_ns() - start
+        self._backend_ns = 0
+
+        return changed
+
+    def _present(self):
+        """
+        Hand the chain to the backend(s).  With one backend per parallel
+        chain, only the bands that changed are drawn, concurrently.
+        """
+
+        start = time.perf_counter_ns()
 
-        # Draw the image.
-        self._backend.draw(self._chain_matrix)
+        if len(self._backends) == 1:
+            backend, matrix = self._backends[0]
+            backend.draw(matrix)
+        else:
+            todo = [self._backends[j] for j in np.flatnonzero(self._changed_bands)]
+            if len(todo) == 1:
+                todo[0][0].draw(todo[0][1])
+            elif len(todo) > 1:
+                if self._backend_executor is None:
+                    self._backend_executor = ThreadPoolExecutor(len(self._backends))
+                futures = [self._backend_executor.submit(b.draw,m)
+                           for b, m in todo]
+                for f in futures:
+                    f.result()
+
+        self._backend_ns = time.perf_counter_ns() - start
+
+    def update_calibration(self):
+        """
+        Read the color calibration of each panel.  This builds one lookup
+        table for the whole chain so calibration is applied to every panel in
+        a single vectorized pass.  Call after changing Panel.calibration.
+        """
+
+        calibrations = [s.calibration for s in self._chain]
+        if all([c is None for c in calibrations]):
+            self._calibration_table = None
+            return
+
+        identity = np.tile(np.arange(256,dtype=np.uint8),(3,1))
+        table = [identity if c is None else c for c in calibrations]
+        self._calibration_table = np.ravel(np.array(table,dtype=np.uint8))
+
+        # Offset of each chain pixel's table in the flattened lookup table.
+        # The padding channel uses the blue table.
+        panel_offsets = self._pixel_panel[:,:,np.newaxis]*3*256
+        channel_offsets = np.array([0,1,2,2])*256
+        offsets = np.zeros(self._chain_matrix.shape,dtype=np.intp)
+        offsets[...] = panel_offsets + channel_offsets
+        self._calibration_offsets = offsets
+        self._calibration_index = np.zeros(self._chain_matrix.shape,
+                                           dtype=np.intp)
+
+    def _calibrate(self,frame):
+        """
+        Apply the per-panel color calibration to a mapped frame in place.
+        """
+
+        np.add(self._calibration_offsets,frame,out=self._calibration_index)
+        np.take(self._calibration_table,self._calibration_index,out=frame,
+                mode="clip")
+
+    def _copy_changed_panels(self,frame):
+        """
+        Compare a newly mapped frame to the chain, copying only the panels that
+        changed.  Returns False if no panel changed (and thus nothing needs to
+        be drawn).
+        """
+
+        # Compare whole RGBX pixels at once by viewing them as 32 bit words
+        frame_words = frame.view(np.uint32)[:,:,0]
+        chain_words = self._chain_matrix.view(np.uint32)[:,:,0]
+
+        # Work band by band (one band per parallel chain)
+        bands = (self._num_parallel,self._band_rows,frame_words.shape[1])
+        frame_words = frame_words.reshape(bands)
+        chain_words = chain_words.reshape(bands)
+
+        np.not_equal(frame_words,chain_words,
+                     out=self._changed_pixels.reshape(bands))
+        np.any(self._changed_pixels.reshape(bands),axis=1,
+               out=self._changed_columns)
+        np.logical_or.reduceat(self._changed_columns.reshape(-1),
+                               self._panel_starts,
+                               out=self._changed_panels.reshape(-1))
+
+        num_changed = np.count_nonzero(self._changed_panels)
+        if num_changed == 0 and not self._force_draw:
+            self._frames_skipped += 1
+            self._panels_skipped += len(self._chain)
+            return False
+
+        self._panels_skipped += len(self._chain) - num_changed
+
+        if self._force_draw:
+            self._changed_bands[:] = True
+        else:
+            np.any(self._changed_panels,axis=1,out=self._changed_bands)
+        self._force_draw = False
+
+        # Copy the columns of changed panels into the chain
+        if num_changed == len(self._chain):
+            np.copyto(chain_words,frame_words)
+        else:
+            np.take(self._changed_panels,self._column_panel,
+                    out=self._changed_columns.reshape(-1))
+            np.copyto(chain_words,frame_words,
+                      where=self._changed_columns[:,np.newaxis,:])
+
+        return True
+
+    def close(self):
+        """
+        Close the backend(s).
+        """
+
+        for backend, matrix in self._backends:
+            backend.close()
+
+        if self._backend_executor is not None:
+            self._backend_executor.shutdown()
+            self._backend_executor = None
+
+    @property
+    def last_map_time_ns(self):
+        """
+        How long (in ns) the last draw spent mapping the image into the chain.
+        """
+
+        return self._map_ns
+
+    @property
+    def last_backend_time_ns(self):
+        """
+        How long (in ns) the last draw spent in the backend (0 if skipped).
+        """
+
+        return self._backend_ns
+
+    @property
+    def frames_skipped(self):
+        """
+        Number of frames that were not drawn because nothing changed.
+        """
+
+        return self._frames_skipped
+
+    @property
+    def panels_skipped(self):
+        """
+        Number of panels (summed over frames) that were not copied into the
+        chain because they had not changed.
+        """
+
+        return self._panels_skipped
   
 
+class DisplayGroup:
+    """
+    Several Displays (e.g. separate walls) driven from the same frames.  Each
+    display shows the region of the frame starting at its offset (by default
+    every display shows the top-left of the frame, mirroring it).  Each
+    display reads its region directly with its own precomputed gather, then
+    the backends of the displays that changed are drawn concurrently.  This
+    exposes the same .draw(), .shape and .frame_buffer() as Display, so can
+    be passed to ArtInstallation in its place.
+    """
+
+    def __init__(self,displays,offsets=None):
+        """
+        displays: list of Display instances.
+        offsets: list of (x,y) positions of the top-left corner of each
+                 display in the frame.  If None, all are at (0,0).
+        """
+
+        self._displays = list(displays)
+        if len(self._displays) == 0:
+            err = "A DisplayGroup needs at least one display.\n"
+            raise ValueError(err)
+
+        if offsets is None:
+            offsets = [(0,0) for d in self._displays]
+        if len(offsets) != len(self._displays):
+            err = "There must be one offset per display.\n"
+            raise ValueError(err)
+
+        # The frame must cover every display
+        x_size = max([o[0] + d._total_x_size for d, o in zip(self._displays,offsets)])
+        y_size = max([o[1] + d._total_y_size for d, o in zip(self._displays,offsets)])
+        self._shape = (x_size,y_size)
+
+        for d, o in zip(self._displays,offsets):
+            d.set_source(self._shape,o)
+
+        self._executor = None
+        self._map_ns = 0
+        self._backend_ns = 0
+
+    @property
+    def displays(self):
+        """
+        The displays in the group.
+        """
+
+        return tuple(self._displays)
+
+    @property
+    def shape(self):
+        """
+        Shape (x,y) of the frames this group draws.
+        """
+
+        return self._shape
+
+    def frame_buffer(self):
+        """
+        Return a new (x,y,4) uint8 RGBA array with the shape of the frames
+        this group draws.
+        """
+
+        return np.zeros(self._shape + (4,),dtype=np.uint8)
+
+    def draw(self,image):
+        """
+        Map image onto every display, then draw the displays that changed.
+        """
+
+        start = time.perf_counter_ns()
+        changed = [d for d in self._displays if d._map(image)]
+        mapped = time.perf_counter_ns()
+
+        if len(changed) == 1:
+            changed[0]._present()
+        elif len(changed) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(len(self._displays))
+            futures = [self._executor.submit(d._present) for d in changed]
+            for f in futures:
+                f.result()
+
+        self._map_ns = mapped - start
+        self._backend_ns = time.perf_counter_ns() - mapped
+
+    def close(self):
+        """
+        Close every display.
+        """
+
+        for d in self._displays:
+            d.close()
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @property
+    def last_map_time_ns(self):
+        """
+        How long (in ns) the last draw spent mapping the image into the
+        chains of all displays.
+        """
+
+        return self._map_ns
+
+    @property
+    def last_backend_time_ns(self):
+        """
+        How long (in ns) the last draw spent drawing the backends.
+        """
+
+        return self._backend_ns
+
+    @property
+    def frames_skipped(self):
+        """
+        Number of frames, summed over displays, that were not drawn because
+        nothing changed.
+        """
+
+        return sum([d.frames_skipped for d in self._displays])
+
+
 class Backend:
     """
-    Dummy Backend that, when subclassed allows plotting of matrices.
+    Dummy Backend that, when subclassed allows plotting of matrices.  The
+    matrix passed to draw is a contiguous uint8 array with shape
+    (rows,columns,4) holding RGBX values.  The same array is passed on every
+    frame.
     """   
  
     def __init__(self):
@@ -271,6 +1043,13 @@ class Backend:
     def draw(self,matrix):
         pass
 
+    def close(self):
+        """
+        Release any resources held by the backend.
+        """
+
+        pass
+
 class MatplotlibBackend(Backend):
 
     def __init__(self):
@@ -280,9 +1059,43 @@ class MatplotlibBackend(Backend):
         
     def draw(self,matrix):
     
-        self._plt.imshow(matrix,interpolation="nearest")
+        self._plt.imshow(matrix[:,:,:3],interpolation="nearest")
         self._plt.show()
 
+class ChainImage:
+    """
+    PIL RGB image that is refreshed from chain matrices, for backends that
+    draw PIL images (rgbmatrix's SetImage only takes RGB images).  The image
+    is allocated once; uint8 RGBX frames are decoded straight into it, so
+    steady-state frames do not allocate a new image.
+    """
+
+    def __init__(self):
+
+        from PIL import Image
+        self._img = Image
+        self._image = None
+
+    def update(self,matrix):
+        """
+        Copy matrix (rows,columns,channels) into the image and return it.
+        """
+
+        size = (matrix.shape[1],matrix.shape[0])
+        if self._image is None or self._image.size != size:
+            self._image = self._img.new("RGB",size)
+
+        if matrix.dtype == np.uint8 and matrix.ndim == 3 and \
+           matrix.shape[2] == 4 and matrix.flags["C_CONTIGUOUS"]:
+            self._image.frombytes(matrix,"raw","RGBX")
+        else:
+            # Fall back on copying anything else
+            rgb = np.ascontiguousarray(matrix[:,:,:3],dtype=np.uint8)
+            self._image.frombytes(rgb,"raw","RGB")
+
+        return self._image
+
+
 class RgbmatrixBackend(Backend):
     
     def __init__(self,rows,chain_length,num_parallel=1,pwmbits=11,brightness=40,corr_luminance=True):
@@ -290,9 +1103,6 @@ class RgbmatrixBackend(Backend):
         Initialize rgbmatrix.
         """
     
-        from PIL import Image
-        self._img = Image
-        
         from rgbmatrix import RGBMatrix
     
         self._rows = int(rows)
@@ -318,16 +1128,69 @@ class RgbmatrixBackend(Backend):
 
         self._canvas = self._matrix.CreateFrameCanvas()
 
+        self._image = ChainImage()
+
     def draw(self,matrix):
         """
         Draw the graphic on the panels.
         """
 
-        # Create a PIL image from the matrix 
-        img = self._img.fromarray(np.uint8(matrix))
+        # Copy the matrix into a PIL image
+        img = self._image.update(matrix)
 
         # Draw it.
         self._canvas.SetImage(img,0,0)
         self._canvas = self._matrix.SwapOnVSync(self._canvas)
   
  
+
+
+class SharedMemoryBackend(Backend):
+    """
+    Write each chain frame into a double-buffered shared memory segment
+    rather than drawing it.  A separate display daemon (see ledsart.daemon)
+    that owns the panels swaps the newest complete frame onto them, so panel
+    refresh is isolated from the art process.
+    """
+
+    def __init__(self,rows,columns,name="ledsart"):
+        """
+        rows: number of rows in the chain (the panel height).
+        columns: number of columns in the chain.
+        name: name of the shared memory segment (passed to the daemon with
+              --name).
+        """
+
+        from .daemon import SharedFrameBuffer
+
+        self._frames = SharedFrameBuffer(name,rows,columns,create=True)
+
+    @property
+    def name(self):
+        """
+        Name of the shared memory segment.
+        """
+
+        return self._frames.name
+
+    @property
+    def sequence(self):
+        """
+        Number of frames written so far.
+        """
+
+        return self._frames.sequence
+
+    def draw(self,matrix):
+        """
+        Publish a frame to the display daemon.
+        """
+
+        self._frames.write(matrix)
+
+    def close(self):
+        """
+        Tell the daemon the frames are done and remove the segment.
+        """
+
+        self._frames.close()
@@ -0,0 +1,275 @@
+__description__ = \
+"""
+Built-in generators that implement the .iterate()/.as_rgba() protocol used by
+ArtInstallation.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import re, inspect
+
+import numpy as np
+
+from .colormap import ColormapLUT
+from .history import History
+
+def parse_rule(rule):
+    """
+    Parse a Life-like rule in B/S notation (e.g. "B3/S23" for Conway's game of
+    life, "B36/S23" for HighLife) into a (2,9) uint8 table.  table[s,n] is the
+    next state of a cell in state s (0 or 1) with n live neighbors.
+    """
+
+    match = re.match(r"^\s*[Bb]([0-8]*)\s*/\s*[Ss]([0-8]*)\s*$",rule)
+    if match is None:
+        err = "rule '{}' is not in B/S notation (e.g. 'B3/S23').\n".format(rule)
+        raise ValueError(err)
+
+    table = np.zeros((2,9),dtype=np.uint8)
+    for n in match.group(1):
+        table[0,int(n)] = 1
+    for n in match.group(2):
+        table[1,int(n)] = 1
+
+    return table
+
+def advance(iterator,n):
+    """
+    Advance iterator n steps, in one call to .iterate_many(n) if it has one
+    and by calling .iterate() n times otherwise.
+    """
+
+    n = int(n)
+    if n <= 0:
+        return
+
+    if hasattr(iterator,"iterate_many"):
+        iterator.iterate_many(n)
+    else:
+        for i in range(n):
+            iterator.iterate()
+
+def takes_out(function):
+    """
+    Whether function (e.g. a generator's .as_rgba) takes an out argument to
+    render into.
+    """
+
+    if function is None:
+        return False
+
+    try:
+        return "out" in inspect.signature(function).parameters
+    except (TypeError,ValueError):
+        return False
+
+
+class IterateManyMixin:
+    """
+    Mixin for generators whose .iterate() takes the number of steps to take,
+    declaring that they can advance many steps in one (vectorized or compiled)
+    call.  ArtInstallation uses .iterate_many() for burn in and skipping
+    ahead.  Generators with some other fast path can override .iterate_many()
+    instead.
+    """
+
+    def iterate_many(self,n):
+        """
+        Advance n steps.
+        """
+
+        self.iterate(n)
+
+
+class Life(IterateManyMixin):
+    """
+    Life-like cellular automaton on a toroidal grid.  Neighbors are counted
+    with shifted sums of a wrapped uint8 grid held in preallocated buffers, so
+    each step is a handful of vectorized operations and allocates nothing.
+    """
+
+    def __init__(self,x_size=64,y_size=64,starting_density=0.5,rule="B3/S23",
+                 seed=None):
+        """
+        Initialize a Life generator.
+
+        x_size: number of cells along x.
+        y_size: number of cells along y.
+        starting_density: fraction of cells that start alive.
+        rule: rule in B/S notation (e.g. "B3/S23").
+        seed: seed for the starting grid.  If None, the global numpy random
+              state is used.  StateCache passes its own seed.
+        """
+
+        self._x_size = int(x_size)
+        self._y_size = int(y_size)
+        if self._x_size < 1 or self._y_size < 1:
+            err = "x_size and y_size must be integers >= 1.\n"
+            raise ValueError(err)
+
+        if starting_density < 0 or starting_density > 1:
+            err = "starting_density must be between 0 and 1.\n"
+            raise ValueError(err)
+
+        self._rule = rule
+        self._table = parse_rule(rule).ravel()
+
+        if seed is None:
+            random = np.random.random((self._x_size,self._y_size))
+        else:
+            random = np.random.RandomState(seed).random_sample((self._x_size,
+                                                               self._y_size))
+
+        # Grid with a one-cell border that holds the wrapped edges
+        self._padded = np.zeros((self._x_size + 2,self._y_size + 2),dtype=np.uint8)
+        self._grid = self._padded[1:-1,1:-1]
+        self._grid[...] = random < starting_density
+
+        # Scratch buffers for neighbor counting
+        self._rows = np.zeros((self._x_size,self._y_size + 2),dtype=np.uint8)
+        self._counts = np.zeros((self._x_size,self._y_size),dtype=np.uint8)
+
+        self._generation = 0
+        self._history = History(1)
+        self._history.push(self._grid)
+        self._luts = {}
+        self._values = None
+
+    @property
+    def rule(self):
+        """
+        Rule in B/S notation.
+        """
+
+        return self._rule
+
+    @property
+    def generation(self):
+        """
+        Number of steps taken.
+        """
+
+        return self._generation
+
+    @property
+    def grid(self):
+        """
+        Current (x_size,y_size) uint8 grid of cell states.  This is updated in
+        place by .iterate().
+        """
+
+        return self._grid
+
+    def _step(self):
+        """
+        Advance the grid one step.
+        """
+
+        p = self._padded
+        x, y = self._x_size, self._y_size
+
+        # Wrap the edges (and corners) into the border
+        p[0,1:-1] = p[x,1:-1]
+        p[x+1,1:-1] = p[1,1:-1]
+        p[:,0] = p[:,y]
+        p[:,y+1] = p[:,1]
+
+        # 3x3 box sum as a sum along x then a sum along y
+        np.add(p[0:x],p[1:x+1],out=self._rows)
+        np.add(self._rows,p[2:x+2],out=self._rows)
+        np.add(self._rows[:,0:y],self._rows[:,1:y+1],out=self._counts)
+        np.add(self._counts,self._rows[:,2:y+2],out=self._counts)
+
+        # Index into the rule table with state*9 + (box sum - state)
+        np.add(self._counts,np.multiply(self._grid,8,out=self._rows[:,:y]),
+               out=self._counts)
+        np.take(self._table,self._counts,out=self._grid)
+
+        self._generation += 1
+
+    def iterate(self,n=1):
+        """
+        Advance n steps.  Only the last steps that are still in the history
+        are recorded, so long runs (e.g. burn in) cost only the steps.
+        """
+
+        n = int(n)
+        record_from = n - self._history.length
+        for i in range(n):
+            self._step()
+            if i >= record_from:
+                self._history.push(self._grid)
+
+    def _set_history_length(self,history_length):
+        """
+        Start keeping history_length steps of history, seeded with the current
+        grid.
+        """
+
+        if history_length != self._history.length:
+            self._history = History(history_length)
+            self._history.push(self._grid)
+
+    def __getstate__(self):
+
+        # _grid is a view into _padded and would be pickled as a copy;
+        # colormap tables are cheap to rebuild.
+        state = self.__dict__.copy()
+        del state["_grid"]
+        state["_luts"] = {}
+        state["_values"] = None
+
+        return state
+
+    def __setstate__(self,state):
+
+        self.__dict__.update(state)
+        self._grid = self._padded[1:-1,1:-1]
+
+    def as_values(self,history_length=1,flip=False,out=None):
+        """
+        Return the fraction of the last history_length steps each cell was
+        alive, as an (x_size,y_size) float array.  If flip is True, this is
+        one minus that fraction.  If out is given, the values are written
+        there.
+        """
+
+        self._set_history_length(history_length)
+
+        values = self._history.value(out)
+        if flip:
+            np.subtract(1,values,out=values)
+
+        return values
+
+    def as_rgba(self,cmap=None,history_length=1,flip=False,out=None):
+        """
+        Return the current state as an (x_size,y_size,4) uint8 RGBA array,
+        colorized by cmap (a matplotlib colormap, name or callable; grayscale
+        if None).  history_length and flip are as in .as_values().  If out is
+        given, the colors are written there.
+        """
+
+        if self._values is None:
+            self._values = np.zeros((self._x_size,self._y_size),dtype=float)
+
+        values = self.as_values(history_length,flip,out=self._values)
+        if out is None:
+            out = np.zeros(values.shape + (4,),dtype=np.uint8)
+
+        if cmap is None:
+            np.multiply(values,255,out=values)
+            np.rint(values,out=values)
+            np.copyto(out[:,:,0],values,casting="unsafe")
+            out[:,:,1] = out[:,:,0]
+            out[:,:,2] = out[:,:,0]
+            out[:,:,3] = 255
+            return out
+
+        try:
+            lut = self._luts[id(cmap)][1]
+        except KeyError:
+            lut = ColormapLUT(cmap)
+            self._luts[id(cmap)] = (cmap,lut)
+
+        return lut.apply(values,out=out)
@@ -0,0 +1,217 @@
+__description__ = \
+"""
+Pluggable GPIO provider.  By default this is RPi.GPIO, imported the first time
+a pin is used.  A simulated GPIO implementation is provided so sensors and the
+main loop can be run (and benchmarked) without Raspberry Pi hardware.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import os, threading, time
+
+_provider = None
+
+def get_gpio():
+    """
+    Return the GPIO provider, creating it on first use.  If the LEDSART_GPIO
+    environment variable is "simulated", a SimulatedGPIO is used; otherwise
+    RPi.GPIO is imported and put in BOARD mode.
+    """
+
+    global _provider
+
+    if _provider is None:
+
+        if os.environ.get("LEDSART_GPIO","rpi") == "simulated":
+            _provider = SimulatedGPIO()
+        else:
+            import RPi.GPIO as GPIO
+            GPIO.setmode(GPIO.BOARD)
+            GPIO.setwarnings(10)
+            _provider = GPIO
+
+    return _provider
+
+def set_gpio(provider):
+    """
+    Use provider (a module or object with the RPi.GPIO interface) for all
+    subsequently created pins.
+    """
+
+    global _provider
+    _provider = provider
+
+
+class SimulatedPWM:
+    """
+    Stand-in for RPi.GPIO.PWM that just records its settings.
+    """
+
+    def __init__(self,pin_number,frequency):
+
+        self.pin_number = pin_number
+        self.frequency = frequency
+        self.duty_cycle = None
+
+    def start(self,duty_cycle):
+
+        self.duty_cycle = duty_cycle
+
+    def stop(self):
+
+        self.duty_cycle = None
+
+
+class SimulatedGPIO:
+    """
+    In-process implementation of the parts of the RPi.GPIO interface used by
+    ledsart.  Input levels can be scripted with .set_input(), and an
+    ultrasonic range finder can be simulated with .set_echo(), which raises
+    the echo pin for a given time after each pulse on the trigger pin.
+    Event callbacks registered with .add_event_detect() are called on their
+    own threads, as with RPi.GPIO.
+    """
+
+    BOARD = 10
+    BCM = 11
+    IN = 1
+    OUT = 0
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._levels = {}
+        self._callbacks = {}
+        self._echoes = {}
+        self._echo_windows = {}
+        self.mode = None
+
+    def setmode(self,mode):
+
+        self.mode = mode
+
+    def setwarnings(self,flag):
+
+        pass
+
+    def setup(self,pin_number,direction,pull_up_down=None,initial=None):
+
+        with self._lock:
+            if initial is not None:
+                self._levels[pin_number] = int(bool(initial))
+            elif pull_up_down == self.PUD_UP:
+                self._levels.setdefault(pin_number,1)
+            else:
+                self._levels.setdefault(pin_number,0)
+
+    def cleanup(self,pin_number=None):
+
+        with self._lock:
+            if pin_number is None:
+                self._callbacks.clear()
+            else:
+                self._callbacks.pop(pin_number,None)
+
+    def output(self,pin_number,value):
+
+        value = int(bool(value))
+        with self._lock:
+            old_value = self._levels.get(pin_number,0)
+            self._levels[pin_number] = value
+
+        # A falling edge on a trigger pin sends a ping
+        if old_value == 1 and value == 0 and pin_number in self._echoes:
+            self._ping(pin_number)
+
+    def input(self,pin_number):
+
+        with self._lock:
+            window = self._echo_windows.get(pin_number)
+            if window is not None:
+                now = time.monotonic()
+                return int(window[0] <= now < window[1])
+
+            return self._levels.get(pin_number,0)
+
+    def add_event_detect(self,pin_number,edge,callback=None,bouncetime=None):
+
+        with self._lock:
+            self._callbacks[pin_number] = (edge,callback)
+
+    def remove_event_detect(self,pin_number):
+
+        with self._lock:
+            self._callbacks.pop(pin_number,None)
+
+    def PWM(self,pin_number,frequency):
+
+        return SimulatedPWM(pin_number,frequency)
+
+    # ------------------------ Scripting interface -------------------------
+
+    def set_input(self,pin_number,level):
+        """
+        Set the level of an input pin, calling any event callback.
+        """
+
+        level = int(bool(level))
+        with self._lock:
+            old_level = self._levels.get(pin_number,0)
+            self._levels[pin_number] = level
+            self._echo_windows.pop(pin_number,None)
+
+        if old_level != level:
+            self._fire(pin_number,level)
+
+    def set_echo(self,trigger_pin,echo_pin,distance,delay=0.0002):
+        """
+        Simulate an ultrasonic range finder: after each pulse on trigger_pin,
+        echo_pin goes high after delay seconds and stays high for as long as
+        sound takes to travel to an object distance meters away and back.  If
+        distance is None, no echo is returned.
+        """
+
+        with self._lock:
+            self._echoes[trigger_pin] = (echo_pin,distance,delay)
+
+    def _ping(self,trigger_pin):
+        """
+        Schedule the echo for a ping on trigger_pin.
+        """
+
+        echo_pin, distance, delay = self._echoes[trigger_pin]
+        if distance is None:
+            return
+
+        start = time.monotonic() + delay
+        stop = start + distance/170.0
+        with self._lock:
+            self._echo_windows[echo_pin] = (start,stop)
+
+        if echo_pin in self._callbacks:
+            for when, level in ((start,1),(stop,0)):
+                timer = threading.Timer(max(0,when - time.monotonic()),
+                                        self._fire,args=(echo_pin,level))
+                timer.daemon = True
+                timer.start()
+
+    def _fire(self,pin_number,level):
+        """
+        Call the event callback for pin_number if it listens for this edge.
+        """
+
+        with self._lock:
+            edge, callback = self._callbacks.get(pin_number,(None,None))
+
+        if callback is None:
+            return
+
+        if edge == self.BOTH or (edge == self.RISING and level == 1) or \
+           (edge == self.FALLING and level == 0):
+            callback(pin_number)
@@ -0,0 +1,218 @@
+__description__ = \
+"""
+Incremental frame history, for rendering trails behind whatever a generator
+draws.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import functools
+
+import numpy as np
+
+class History:
+    """
+    Accumulate a history of frames so their average can be read out in
+    O(pixels) per frame, however long the history is.
+
+    In "window" mode, the last length frames are kept in a ring buffer and a
+    running sum is updated by adding the newest frame and subtracting the one
+    it replaces.  In "exponential" mode, an exponential moving average is kept
+    instead (no ring buffer), with each older frame weighted by decay.
+    """
+
+    def __init__(self,length=10,mode="window",decay=None):
+        """
+        Initialize a History.
+
+        length: number of frames to average over in "window" mode.  In
+                "exponential" mode this sets the default decay.
+        mode: "window" or "exponential".
+        decay: weight of the previous average in "exponential" mode
+               (0 to 1).  Defaults to 1 - 1/length.
+        """
+
+        self._length = int(length)
+        if self._length < 1:
+            err = "length must be an integer >= 1.\n"
+            raise ValueError(err)
+
+        if mode not in ("window","exponential"):
+            err = "mode must be 'window' or 'exponential'.\n"
+            raise ValueError(err)
+        self._mode = mode
+
+        if decay is None:
+            decay = 1 - 1/self._length
+        if decay < 0 or decay >= 1:
+            err = "decay must be between 0 and 1.\n"
+            raise ValueError(err)
+        self._decay = decay
+
+        self._frames = None
+        self._total = None
+        self._scratch = None
+        self._index = 0
+        self._count = 0
+
+    def _allocate(self,frame):
+        """
+        Allocate buffers for frames like frame.  Integer frames are summed
+        exactly in int64; everything else in float64.
+        """
+
+        if self._mode == "window":
+            self._frames = np.zeros((self._length,) + frame.shape,
+                                    dtype=frame.dtype)
+            if np.issubdtype(frame.dtype,np.integer):
+                self._total = np.zeros(frame.shape,dtype=np.int64)
+            else:
+                self._total = np.zeros(frame.shape,dtype=float)
+        else:
+            self._total = np.array(frame,dtype=float)
+            self._scratch = np.zeros(frame.shape,dtype=float)
+
+        self._index = 0
+        self._count = 0
+
+    @property
+    def length(self):
+        """
+        Number of frames in the window.
+        """
+
+        return self._length
+
+    def push(self,frame):
+        """
+        Add a frame to the history.
+        """
+
+        frame = np.asarray(frame)
+        if self._total is None or self._total.shape != frame.shape:
+            self._allocate(frame)
+
+        if self._mode == "exponential":
+            if self._count > 0:
+                self._total *= self._decay
+                np.multiply(frame,1 - self._decay,out=self._scratch)
+                self._total += self._scratch
+            self._count += 1
+            return
+
+        # Replace the oldest frame in the window
+        if self._count == self._length:
+            self._total -= self._frames[self._index]
+        else:
+            self._count += 1
+
+        self._frames[self._index] = frame
+        self._total += self._frames[self._index]
+        self._index = (self._index + 1) % self._length
+
+    def value(self,out=None):
+        """
+        Return the average over the history.  If out is given, the result is
+        written (and cast) into it.
+        """
+
+        if self._count == 0:
+            err = "History is empty.\n"
+            raise ValueError(err)
+
+        if out is None:
+            out = np.zeros(self._total.shape,dtype=float)
+
+        if self._mode == "exponential":
+            np.copyto(out,self._total,casting="unsafe")
+        else:
+            np.divide(self._total,self._count,out=out,casting="unsafe")
+
+        return out
+
+    def clear(self):
+        """
+        Forget all frames.
+        """
+
+        self._total = None
+        self._frames = None
+        self._index = 0
+        self._count = 0
+
+
+class Trails:
+    """
+    Wrap a generator so its output is averaged over its recent history,
+    leaving trails behind anything that moves.  This exposes .iterate() and
+    .as_rgba() (and .as_values(), if the generator does), so can be used
+    anywhere a generator can.  Use with_trails() to build a generator class
+    for ArtInstallation.
+    """
+
+    def __init__(self,generator,history_length=10,mode="window",decay=None,
+                 **config):
+        """
+        generator: generator class to wrap.
+        history_length, mode, decay: passed to History.
+        config: **kwargs passed to the generator __init__.
+        """
+
+        self._generator = generator(**config)
+        self._rgba_history = History(history_length,mode,decay)
+        self._value_history = History(history_length,mode,decay)
+
+    def iterate(self):
+
+        self._generator.iterate()
+
+    @property
+    def iterate_many(self):
+        """
+        .iterate_many() of the wrapped generator (only present if the
+        generator has .iterate_many()).
+        """
+
+        if not hasattr(self._generator,"iterate_many"):
+            raise AttributeError("iterate_many")
+
+        return self._generator.iterate_many
+
+    def as_rgba(self,out=None,**kwargs):
+
+        frame = np.asarray(self._generator.as_rgba(**kwargs))
+        self._rgba_history.push(frame)
+
+        if out is None:
+            out = np.zeros(frame.shape,dtype=frame.dtype)
+
+        return self._rgba_history.value(out)
+
+    @property
+    def as_values(self):
+        """
+        Averaged .as_values() of the wrapped generator (only present if the
+        generator has .as_values()).
+        """
+
+        if not hasattr(self._generator,"as_values"):
+            raise AttributeError("as_values")
+
+        return self._as_values
+
+    def _as_values(self,out=None,**kwargs):
+
+        self._value_history.push(self._generator.as_values(**kwargs))
+
+        return self._value_history.value(out)
+
+
+def with_trails(generator,history_length=10,mode="window",decay=None):
+    """
+    Return a generator "class" (a callable taking the generator's **kwargs)
+    whose output is the trailing average of generator's output.  For example,
+    ArtInstallation(with_trails(conway.Conway,20),display,...).
+    """
+
+    return functools.partial(Trails,generator,history_length=history_length,
+                             mode=mode,decay=decay)
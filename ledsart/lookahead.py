@@ -0,0 +1,210 @@
+__description__ = \
+"""
+Run a generator in a worker process that computes frames ahead of time into a
+ring of shared memory buffers.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import collections, multiprocessing, queue
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from .generators import advance
+
+def _worker(generator,config,plot_config,burn_in,state_cache,
+            free_slots,filled_slots,conn):
+    """
+    Function run by the worker process.  Creates and burns in the generator,
+    tells the main process the shape of its frames, then fills whichever ring
+    slots are free until it receives a None slot.
+    """
+
+    if state_cache is not None:
+        iterator = state_cache.build(generator,config,burn_in)
+    else:
+        iterator = generator(**config)
+        advance(iterator,burn_in)
+
+    iterator.iterate()
+    frame = np.asarray(iterator.as_rgba(**plot_config))
+    conn.send((frame.shape,frame.dtype.str))
+
+    # Attach to the ring created by the main process
+    names = conn.recv()
+    blocks = [shared_memory.SharedMemory(name=n) for n in names]
+    ring = [np.ndarray(frame.shape,dtype=frame.dtype,buffer=b.buf)
+            for b in blocks]
+
+    ring[0][...] = frame
+    filled_slots.put(0)
+
+    try:
+        while True:
+
+            slot = free_slots.get()
+            if slot is None:
+                break
+
+            # Pick up any change in plot style
+            while conn.poll():
+                plot_config = conn.recv()
+
+            iterator.iterate()
+            ring[slot][...] = iterator.as_rgba(**plot_config)
+            filled_slots.put(slot)
+
+    finally:
+        ring = None
+        for b in blocks:
+            b.close()
+
+
+class LookaheadGenerator:
+    """
+    Wrap a generator class so that it runs in a worker process.  The worker
+    computes frames ahead of time into a ring of shared memory buffers, so the
+    frames never have to be pickled.  This exposes .iterate() and .as_rgba()
+    and can be used in place of the generator instance.
+
+    The array returned by .as_rgba() is a view into the ring.  It stays valid
+    until hold more calls to .iterate() have been made.
+    """
+
+    def __init__(self,generator,config={},plot_config={},burn_in=0,
+                 lookahead=2,hold=1,state_cache=None):
+        """
+        Initialize the generator and start the worker process.
+
+        generator: generator class (NOT instance!).  It must be importable by
+                   the worker process.
+        config: dictionary passed as **kwargs to the generator __init__.
+        plot_config: dictionary passed as **kwargs to .as_rgba.
+        burn_in: how many times to run iterate() in the worker before the
+                 first frame.
+        lookahead: how many frames the worker may compute ahead of the frame
+                   currently being shown.
+        hold: how many of the most recent frames must stay valid.
+        state_cache: StateCache the worker uses to load (or store) the
+                     burned-in generator.
+        """
+
+        lookahead = int(lookahead)
+        hold = int(hold)
+        if lookahead < 1 or hold < 1:
+            err = "lookahead and hold must be integers >= 1.\n"
+            raise ValueError(err)
+
+        self._plot_config = dict(plot_config)
+        self._hold = hold
+        self._held = collections.deque()
+
+        ring_size = lookahead + hold
+
+        self._free_slots = multiprocessing.Queue()
+        self._filled_slots = multiprocessing.Queue()
+        self._conn, worker_conn = multiprocessing.Pipe()
+
+        self._process = multiprocessing.Process(target=_worker,
+                                                args=(generator,config,
+                                                      self._plot_config,burn_in,
+                                                      state_cache,
+                                                      self._free_slots,
+                                                      self._filled_slots,
+                                                      worker_conn))
+        self._process.daemon = True
+
+        # Make sure the worker shares our resource tracker rather than starting
+        # its own, which would try to clean up the ring a second time.
+        resource_tracker.ensure_running()
+        self._process.start()
+        worker_conn.close()
+
+        # Wait for the worker to report the frame shape, then create the ring
+        self._blocks = []
+        self._ring = []
+        try:
+            shape, dtype = self._conn.recv()
+        except EOFError:
+            self._process.join()
+            err = "generator worker process exited before its first frame.\n"
+            raise RuntimeError(err)
+
+        dtype = np.dtype(dtype)
+        num_bytes = max(1,int(np.prod(shape))*dtype.itemsize)
+        for i in range(ring_size):
+            block = shared_memory.SharedMemory(create=True,size=num_bytes)
+            self._blocks.append(block)
+            self._ring.append(np.ndarray(shape,dtype=dtype,buffer=block.buf))
+
+        self._conn.send([b.name for b in self._blocks])
+
+        # Slot 0 holds the first frame; the rest are free for the worker
+        for i in range(1,ring_size):
+            self._free_slots.put(i)
+
+    def _next_slot(self):
+        """
+        Wait for the worker to fill the next slot.
+        """
+
+        while True:
+            try:
+                return self._filled_slots.get(timeout=0.5)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    err = "generator worker process died.\n"
+                    raise RuntimeError(err)
+
+    def iterate(self):
+        """
+        Advance to the next frame computed by the worker.
+        """
+
+        self._held.append(self._next_slot())
+        while len(self._held) > self._hold:
+            self._free_slots.put(self._held.popleft())
+
+    def as_rgba(self,**plot_config):
+        """
+        Return the current frame.  If plot_config differs from the last one,
+        the worker switches to it; frames it already computed keep the old
+        style.
+        """
+
+        if plot_config != self._plot_config:
+            self._plot_config = dict(plot_config)
+            self._conn.send(self._plot_config)
+
+        if len(self._held) == 0:
+            self.iterate()
+
+        return self._ring[self._held[-1]]
+
+    def close(self):
+        """
+        Stop the worker process and release the shared memory.
+        """
+
+        if self._process is None:
+            return
+
+        self._free_slots.put(None)
+        self._process.join(timeout=1)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._process = None
+
+        self._ring = []
+        self._held.clear()
+        for b in self._blocks:
+            try:
+                b.close()
+            except BufferError:
+                # Someone still holds a frame; the memory is released when
+                # they let go of it.
+                pass
+            b.unlink()
+        self._blocks = []
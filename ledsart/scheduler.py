@@ -0,0 +1,129 @@
+__description__ = \
+"""
+Deadline-based scheduling for the main loop.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import collections, threading, time, asyncio
+
+import numpy as np
+
+class FrameScheduler:
+    """
+    Sleep until the next deadline on the monotonic clock, waking early if
+    someone calls .wake().  Also keeps track of how late each frame started
+    relative to its deadline.
+    """
+
+    def __init__(self,history=1000):
+        """
+        Initialize a FrameScheduler.
+
+        history: how many of the most recent frames to keep timing for.
+        """
+
+        self._wake_event = threading.Event()
+        self._lateness = collections.deque(maxlen=int(history))
+
+        self._loop = None
+        self._async_event = None
+
+    def now(self):
+        """
+        Current time on the monotonic clock.
+        """
+
+        return time.monotonic()
+
+    def wait_until(self,deadline):
+        """
+        Sleep until deadline (monotonic clock) or until .wake() is called.
+        Returns True if woken early.
+        """
+
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            woken = self._wake_event.is_set()
+        else:
+            woken = self._wake_event.wait(timeout)
+        self._wake_event.clear()
+
+        return woken
+
+    def attach_loop(self,loop):
+        """
+        Let .wait_until_async() be used on the asyncio event loop loop, so
+        .wake() (from any thread) also wakes coroutines waiting there.  Call
+        from the event loop thread.
+        """
+
+        self._loop = loop
+        self._async_event = asyncio.Event()
+
+    def detach_loop(self):
+        """
+        Stop waking the attached event loop.
+        """
+
+        self._loop = None
+        self._async_event = None
+
+    async def wait_until_async(self,deadline):
+        """
+        Coroutine version of .wait_until() for the attached event loop.
+        """
+
+        event = self._async_event
+
+        timeout = deadline - time.monotonic()
+        if timeout > 0 and not self._wake_event.is_set():
+            try:
+                await asyncio.wait_for(event.wait(),timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        woken = self._wake_event.is_set()
+        self._wake_event.clear()
+        event.clear()
+
+        return woken
+
+    def wake(self):
+        """
+        Wake up the loop immediately.  Safe to call from any thread.
+        """
+
+        self._wake_event.set()
+
+        loop, event = self._loop, self._async_event
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The event loop has been closed
+                pass
+
+    def record_frame(self,deadline,start):
+        """
+        Record that a frame due at deadline started at start.
+        """
+
+        self._lateness.append(start - deadline)
+
+    def jitter(self):
+        """
+        Return statistics (in seconds) for how late frames started relative to
+        their deadlines over the recorded history.
+        """
+
+        if len(self._lateness) == 0:
+            return {"count":0,"mean":0.0,"std":0.0,"min":0.0,"max":0.0}
+
+        lateness = np.array(self._lateness)
+
+        return {"count":len(lateness),
+                "mean":float(np.mean(lateness)),
+                "std":float(np.std(lateness)),
+                "min":float(np.min(lateness)),
+                "max":float(np.max(lateness))}
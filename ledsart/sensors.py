@@ -1,8 +1,11 @@
-import time
+import time, threading
 
-import RPi.GPIO as GPIO
-GPIO.setmode(GPIO.BOARD)
-GPIO.setwarnings(10)
+import numpy as np
+
+from .gpio import get_gpio
+
+# Longest an ultrasonic echo takes (about 8 m there and back), in seconds
+_ECHO_TIMEOUT = 0.05
 
 class Sensor:
     """
@@ -11,7 +14,8 @@ class Sensor:
     """
 
     def __init__(self,sensor,property_to_mod,
-                 half_value=1.0,max_value=300,steepness=4):
+                 half_value=1.0,max_value=300,steepness=4,
+                 filter=None,window=5,alpha=0.3,hysteresis=0.0,debounce=0.0):
         """
         Initialize sensor.
 
@@ -23,28 +27,230 @@ class Sensor:
         half_value: point where value sets property to 1/2 of max_value
         max_value: maximum value of property_to_mod
         steepness: how steeply property_to_mod changes with sensor value.
+        filter: how to smooth numerical values.  None (no filtering),
+                "median" (median of the last window values) or "ema"
+                (exponential moving average with weight alpha on the newest
+                value).
+        window: number of values kept for the median filter.
+        alpha: weight of the newest value for the ema filter (0 to 1).
+        hysteresis: only change the output when the filtered value moves more
+                    than this far from the current output.
+        debounce: for boolean sensors, how long (in seconds) a new state must
+                  hold before it is reported.
         """
 
+        if filter not in (None,"median","ema"):
+            err = "filter must be None, 'median' or 'ema'.\n"
+            raise ValueError(err)
+
+        if int(window) < 1:
+            err = "window must be an integer >= 1.\n"
+            raise ValueError(err)
+
+        if alpha <= 0 or alpha > 1:
+            err = "alpha must be between 0 and 1.\n"
+            raise ValueError(err)
+
         self.sensor = sensor
         self.property_to_mod = property_to_mod
         self.half_value = half_value
         self.max_value = max_value
         self.steepness = steepness
 
+        self.filter = filter
+        self.alpha = alpha
+        self.hysteresis = hysteresis
+        self.debounce = debounce
+
+        # Filter state: a ring buffer of recent values, the moving average,
+        # the current output and the debounce state.
+        self._history = np.zeros(int(window),dtype=float)
+        self._history_index = 0
+        self._history_count = 0
+        self._ema = None
+        self._output = None
+        self._stable_state = None
+        self._pending_state = None
+        self._pending_since = 0.0
+        self._filter_lock = threading.Lock()
+
+        # Called (with no arguments) whenever background sampling sees the
+        # processed value change.
+        self.on_change = None
+
+        self._latest = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
     def read_and_process(self):
         """
+        Read the sensor and process the value.
+        """
+
+        return self.process(self.sensor.read())
+
+    def process(self,v):
+        """
+        Map a raw sensor value to the value of property_to_mod, then filter
+        it.
         """
 
-        v = self.sensor.read()
+        with self._filter_lock:
+
+            if type(v) == bool:
+                return self._debounce(v)
 
-        if type(v) == bool:
-            return v
+            return self._filter(self._map(v))
+
+    def _map(self,v):
+        """
+        Map a raw numerical value onto the Hill-type curve.
+        """
 
         if v < 0:
             return self.max_value
         A = (v/self.half_value)**self.steepness
 
         return A/(1 + A)*self.max_value
+
+    def _filter(self,value):
+        """
+        Smooth a mapped value.  Each step is O(1) in the number of samples
+        taken: the median is over the fixed-size history.
+        """
+
+        if self.filter == "median":
+            self._history[self._history_index] = value
+            self._history_index = (self._history_index + 1) % len(self._history)
+            self._history_count = min(self._history_count + 1,len(self._history))
+            value = float(np.median(self._history[:self._history_count]))
+
+        elif self.filter == "ema":
+            if self._ema is None:
+                self._ema = value
+            else:
+                self._ema = self.alpha*value + (1 - self.alpha)*self._ema
+            value = self._ema
+
+        # Hysteresis: hold the output until the value moves far enough
+        if self._output is None or abs(value - self._output) > self.hysteresis:
+            self._output = value
+
+        return self._output
+
+    def _debounce(self,state):
+        """
+        Only report a new boolean state once it has held for debounce
+        seconds.
+        """
+
+        now = time.monotonic()
+        if self._stable_state is None:
+            self._stable_state = state
+
+        if state == self._stable_state:
+            self._pending_state = None
+            return self._stable_state
+
+        if state != self._pending_state:
+            self._pending_state = state
+            self._pending_since = now
+
+        if now - self._pending_since >= self.debounce:
+            self._stable_state = state
+            self._pending_state = None
+
+        return self._stable_state
+
+    @property
+    def sampling(self):
+        """
+        Whether the sensor is being sampled on a background thread.
+        """
+
+        return self._thread is not None
+
+    def start_sampling(self,interval=0.05):
+        """
+        Sample the sensor every interval seconds on a background thread.  If
+        the sensor exposes .set_callback (i.e. it is driven by GPIO edge
+        events), readings are processed only as they arrive through the
+        callback; the thread just calls the sensor's .trigger() (if it has
+        one) to start each measurement.  The latest value is available,
+        without blocking, from .current_value().
+        """
+
+        if self._thread is not None:
+            return
+
+        if hasattr(self.sensor,"set_callback"):
+            self.sensor.set_callback(self._store)
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample_loop,
+                                        args=(interval,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop_sampling(self):
+        """
+        Stop sampling on the background thread.
+        """
+
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+        if hasattr(self.sensor,"set_callback"):
+            self.sensor.set_callback(None)
+
+    def _sample_loop(self,interval):
+        """
+        Read the sensor until told to stop.  Runs on its own thread.
+        """
+
+        # Event-driven sensors deliver each reading once, via the callback;
+        # storing what .read() returns as well would count it twice.
+        events = hasattr(self.sensor,"set_callback")
+        trigger = getattr(self.sensor,"trigger",None)
+
+        while not self._stop_event.is_set():
+            if not events:
+                self._store(self.sensor.read())
+            else:
+                if trigger is not None:
+                    trigger()
+
+                # Let a pending debounced state settle without new edges
+                if self._pending_state is not None:
+                    self._store(self._pending_state)
+
+            self._stop_event.wait(interval)
+
+    def _store(self,v):
+        """
+        Process a raw value and store it in the latest-value slot.
+        """
+
+        value = self.process(v)
+        if value != self._latest:
+            self._latest = value
+            if self.on_change is not None:
+                self.on_change()
+
+    def current_value(self):
+        """
+        Return the latest value from background sampling, or read the sensor
+        directly if it is not being sampled.
+        """
+
+        if self._thread is None or self._latest is None:
+            return self.read_and_process()
+
+        return self._latest
         
 class Pin:
     """
@@ -60,13 +266,17 @@ class Pin:
  
         self._pwm = None
 
+        # Hardware is only touched (and RPi.GPIO imported) once a pin is used
+        self._gpio = get_gpio()
+
         if self.as_input == True:
             if initial_pull == None:
-                GPIO.setup(self.pin_number,GPIO.IN)
+                self._gpio.setup(self.pin_number,self._gpio.IN)
             else:
-                GPIO.setup(self.pin_number,GPIO.IN,pull_up_down=initial_pull)
+                self._gpio.setup(self.pin_number,self._gpio.IN,
+                                 pull_up_down=initial_pull)
         else:
-            GPIO.setup(self.pin_number, GPIO.OUT)
+            self._gpio.setup(self.pin_number, self._gpio.OUT)
             self.down()
 
     def up(self):
@@ -75,7 +285,7 @@ class Pin:
         """
 
         if self._pwm == None:
-            GPIO.output(self.pin_number,True)
+            self._gpio.output(self.pin_number,True)
         else:
             err = "cannot set to 'up': pulse width modulation running on pin.\n"
             raise ValueError(err)
@@ -86,7 +296,7 @@ class Pin:
         """
 
         if self._pwm == None:
-            GPIO.output(self.pin_number,False)
+            self._gpio.output(self.pin_number,False)
         else:
             err = "cannot set to 'down': pulse width modulation running on pin.\n"
             raise ValueError(err)
@@ -96,7 +306,25 @@ class Pin:
         Read the state of a pin.
         """
 
-        return GPIO.input(self.pin_number)
+        return self._gpio.input(self.pin_number)
+
+    def add_event_detect(self,callback,edge=None):
+        """
+        Call callback (with the pin number as its argument) whenever the pin
+        changes state.  edge defaults to both rising and falling edges.
+        """
+
+        if edge is None:
+            edge = self._gpio.BOTH
+
+        self._gpio.add_event_detect(self.pin_number,edge,callback=callback)
+
+    def remove_event_detect(self):
+        """
+        Stop calling back on pin state changes.
+        """
+
+        self._gpio.remove_event_detect(self.pin_number)
 
     def start_pwm(self):
         """
@@ -104,7 +332,7 @@ class Pin:
         self.duty_cycle).
         """
 
-        self._pwm = GPIO.PWM(self.pin_number,self.frequency)
+        self._pwm = self._gpio.PWM(self.pin_number,self.frequency)
         self._pwm.start(self.duty_cycle)
 
     def stop_pwm(self):
@@ -150,7 +378,7 @@ class Pin:
             self.stop_pwm()
         self.down()   
 
-        GPIO.cleanup(self.pin_number)
+        self._gpio.cleanup(self.pin_number)
 
 
 class Button:
@@ -158,12 +386,44 @@ class Button:
     Class for listening to a button via a gpio pin.
     """
     
-    def __init__(self,gpio_pin):
+    def __init__(self,gpio_pin,use_events=False):
+        """
+        gpio_pin: pin the button is attached to.
+        use_events: track the button state with GPIO edge events rather than
+                    reading the pin on every call to .read().
+        """
    
-        self.pin = Pin(gpio_pin,as_input=True,initial_pull=GPIO.PUD_UP)
+        self.pin = Pin(gpio_pin,as_input=True,initial_pull=get_gpio().PUD_UP)
+        self.use_events = use_events
+
+        self._callback = None
+        self._pressed = False
+        if self.use_events:
+            self._pressed = not self.pin.input()
+            self.pin.add_event_detect(self._edge)
+
+    def _edge(self,channel):
+        """
+        Record the new button state on a GPIO edge.
+        """
+
+        self._pressed = not self.pin.input()
+        if self._callback is not None:
+            self._callback(self._pressed)
+
+    def set_callback(self,callback):
+        """
+        Call callback with the new state whenever the button changes (only
+        when using events).
+        """
+
+        self._callback = callback
 
     def read(self):
 
+        if self.use_events:
+            return self._pressed
+
         return not self.pin.input()
     
 
@@ -173,27 +433,110 @@ class UltrasonicRange:
     trigger pin that sends out a pulse and a echo pin that recieves the return).
     """
 
-    def __init__(self,trigger_pin,echo_pin,timeout=100):
+    def __init__(self,trigger_pin,echo_pin,timeout=100,use_events=False):
+        """
+        trigger_pin: pin that sends the ping.
+        echo_pin: pin that receives the echo.
+        timeout: number of times to poll the echo pin before giving up.
+        use_events: time the echo with GPIO edge events.  .read() then sends
+                    a ping and returns immediately with the distance measured
+                    by the last completed ping (or -1 if the last ping got no
+                    echo).
+        """
 
         self.trigger_pin = Pin(trigger_pin)
         self.echo_pin = Pin(echo_pin,as_input=True)
 
         self.timeout = timeout
+        self.use_events = use_events
+
+        self._callback = None
+        self._echo_start = None
+        self._distance = -1.0
+        self._ping_time = None
+        self._echo_done = True
+        if self.use_events:
+            self.echo_pin.add_event_detect(self._edge)
 
         # Allow module to settle
         time.sleep(0.5)
     
-    def read(self):
+    def _edge(self,channel):
         """
-        Calculate the distance to a target based on the length of the return
-        echo. Returns a negative value of the system times out.
+        Time the echo: record when it starts and calculate the distance when
+        it ends.
+        """
+
+        now = time.monotonic()
+        if self.echo_pin.input():
+            self._echo_start = now
+            return
+
+        if self._echo_start is None:
+            return
+
+        self._distance = (now - self._echo_start)*170
+        self._echo_start = None
+        self._echo_done = True
+        if self._callback is not None:
+            self._callback(self._distance)
+
+    def set_callback(self,callback):
+        """
+        Call callback with the distance whenever an echo finishes (only when
+        using events).
+        """
+
+        self._callback = callback
+
+    def _echo_lost(self,now):
+        """
+        Whether the last ping has gone unanswered for longer than any echo
+        takes.
+        """
+
+        return not self._echo_done and now - self._ping_time > _ECHO_TIMEOUT
+
+    def _ping(self):
+        """
+        Send a 10 us pulse on the trigger pin.
         """
 
-        # Send 10 us pulse trigger
         self.trigger_pin.up()
         time.sleep(0.00001)
         self.trigger_pin.down()
 
+    def trigger(self):
+        """
+        Send a ping (only when using events).  The distance arrives through
+        the callback and the next .read().  Does nothing while the echo of
+        the last ping is still expected.
+        """
+
+        now = time.monotonic()
+        if not self._echo_done and not self._echo_lost(now):
+            return
+
+        self._ping_time = now
+        self._echo_done = False
+        self._ping()
+
+    def read(self):
+        """
+        Calculate the distance to a target based on the length of the return
+        echo. Returns a negative value of the system times out.
+        """
+
+        # With events, report the last completed echo and start a new ping
+        if self.use_events:
+            distance = self._distance
+            if self._ping_time is not None and self._echo_lost(time.monotonic()):
+                distance = -1.0
+            self.trigger()
+            return distance
+
+        self._ping()
+
         # Find start of echo
         counter = 0 
         start = time.time()
@@ -223,6 +566,9 @@ class UltrasonicRange:
         Shut down and clean up the pins.
         """     
  
+        if self.use_events:
+            self.echo_pin.remove_event_detect()
+
         self.trigger_pin.stop()
         self.echo_pin.stop()
        
@@ -0,0 +1,264 @@
+__description__ = \
+"""
+Low-overhead timing statistics for the main loop, with a Prometheus-style
+text exporter.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import os, stat, socket, threading
+
+import numpy as np
+
+class RollingTimer:
+    """
+    Keep the most recent durations (in nanoseconds) for one stage of the loop
+    in a fixed-size ring buffer.  Recording is O(1); percentiles are only
+    calculated when asked for.
+    """
+
+    def __init__(self,size=1024):
+
+        self._durations = np.zeros(int(size),dtype=np.int64)
+        self._index = 0
+        self._count = 0
+
+    def add(self,duration_ns):
+        """
+        Record a duration in nanoseconds.
+        """
+
+        self._durations[self._index] = duration_ns
+        self._index = (self._index + 1) % len(self._durations)
+        self._count += 1
+
+    @property
+    def count(self):
+        """
+        Total number of durations recorded (not just those still held).
+        """
+
+        return self._count
+
+    def summary(self):
+        """
+        Return the count and the mean, p50, p95 and p99 (in ms) of the held
+        durations.
+        """
+
+        held = self._durations[:min(self._count,len(self._durations))]
+        if len(held) == 0:
+            return {"count":0,"mean_ms":0.0,"p50_ms":0.0,"p95_ms":0.0,
+                    "p99_ms":0.0}
+
+        p50, p95, p99 = np.percentile(held,(50,95,99))/1e6
+
+        return {"count":self._count,
+                "mean_ms":float(np.mean(held))/1e6,
+                "p50_ms":float(p50),
+                "p95_ms":float(p95),
+                "p99_ms":float(p99)}
+
+
+class LoopStats:
+    """
+    Collect per-stage timings, frame times and frame counters for an
+    ArtInstallation.  Stages can be recorded from several threads, and
+    summarized from another (e.g. by StatsWriter).
+    """
+
+    def __init__(self,size=1024):
+
+        self._size = size
+        self._timers = {}
+        self._timers_lock = threading.Lock()
+        self._frame_times = np.zeros(int(size),dtype=np.int64)
+        self._frame_index = 0
+        self._frame_count = 0
+        self.late_frames = 0
+
+    def record(self,stage,duration_ns):
+        """
+        Record how long (in ns) one pass through stage took.
+        """
+
+        try:
+            timer = self._timers[stage]
+        except KeyError:
+            with self._timers_lock:
+                timer = self._timers.setdefault(stage,RollingTimer(self._size))
+
+        timer.add(duration_ns)
+
+    def record_frame(self,time_ns):
+        """
+        Record that a frame was shown at time_ns (perf_counter_ns).
+        """
+
+        self._frame_times[self._frame_index] = time_ns
+        self._frame_index = (self._frame_index + 1) % len(self._frame_times)
+        self._frame_count += 1
+
+    def frame_rate(self):
+        """
+        Frames per second over the held frame times.
+        """
+
+        held = min(self._frame_count,len(self._frame_times))
+        if held < 2:
+            return 0.0
+
+        newest = self._frame_times[(self._frame_index - 1) % len(self._frame_times)]
+        oldest = self._frame_times[(self._frame_index - held) % len(self._frame_times)]
+        if newest == oldest:
+            return 0.0
+
+        return (held - 1)/((newest - oldest)/1e9)
+
+    def summary(self):
+        """
+        Return a dictionary of the current statistics.
+        """
+
+        # New stages may be added while we summarize
+        with self._timers_lock:
+            timers = list(self._timers.items())
+
+        return {"frames":self._frame_count,
+                "fps":self.frame_rate(),
+                "late_frames":self.late_frames,
+                "stages":dict([(k,v.summary()) for k,v in timers])}
+
+
+def format_prometheus(stats,prefix="ledsart"):
+    """
+    Format the dictionary returned by ArtInstallation.stats() as
+    Prometheus-style text.
+    """
+
+    lines = []
+    for key in sorted(stats):
+        if key == "stages":
+            continue
+        value = stats[key]
+        if isinstance(value,(bool,int,float)):
+            lines.append("{}_{} {}".format(prefix,key,float(value)))
+
+    quantiles = (("0.5","p50_ms"),("0.95","p95_ms"),("0.99","p99_ms"))
+    for stage in sorted(stats.get("stages",{})):
+        summary = stats["stages"][stage]
+        name = "{}_stage_seconds".format(prefix)
+        for q, k in quantiles:
+            lines.append('{}{{stage="{}",quantile="{}"}} {}'.format(name,stage,q,
+                                                                    summary[k]/1000))
+        lines.append('{}_count{{stage="{}"}} {}'.format(name,stage,
+                                                        summary["count"]))
+
+    return "\n".join(lines) + "\n"
+
+
+class StatsWriter:
+    """
+    Periodically write the statistics of an ArtInstallation in Prometheus text
+    format to a file and/or serve them on a Unix socket (each connection gets
+    the latest text, then the socket is closed).
+    """
+
+    def __init__(self,get_stats,path=None,socket_path=None,interval=10.0):
+        """
+        get_stats: callable that returns the statistics dictionary.
+        path: file to write to (replaced atomically).
+        socket_path: path of Unix socket to serve on.  A stale socket at this
+                     path is replaced; anything else there makes .start()
+                     raise ValueError.
+        interval: how often (in seconds) to refresh the statistics.
+        """
+
+        self._get_stats = get_stats
+        self.path = path
+        self.socket_path = socket_path
+        self.interval = interval
+
+        self._text = ""
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._server = None
+
+    def start(self):
+        """
+        Start writing (and serving) on background threads.
+        """
+
+        self._stop_event.clear()
+        self._refresh()
+
+        targets = [self._write_loop]
+        if self.socket_path is not None:
+            # Remove a socket left by an earlier run, but never anything else
+            if os.path.lexists(self.socket_path):
+                if not stat.S_ISSOCK(os.lstat(self.socket_path).st_mode):
+                    err = "{} exists and is not a socket.\n".format(self.socket_path)
+                    raise ValueError(err)
+                os.remove(self.socket_path)
+            self._server = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+            self._server.bind(self.socket_path)
+            self._server.listen(4)
+            self._server.settimeout(0.5)
+            targets.append(self._serve_loop)
+
+        for target in targets:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stop the background threads and remove the socket.
+        """
+
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            # Remove a socket left by an earlier run, but never anything else
+            if os.path.lexists(self.socket_path):
+                if not stat.S_ISSOCK(os.lstat(self.socket_path).st_mode):
+                    err = "{} exists and is not a socket.\n".format(self.socket_path)
+                    raise ValueError(err)
+                os.remove(self.socket_path)
+
+    def _refresh(self):
+        """
+        Update the text (and the file, if writing to one).
+        """
+
+        self._text = format_prometheus(self._get_stats())
+
+        if self.path is not None:
+            tmp_path = "{}.tmp".format(self.path)
+            with open(tmp_path,"w") as f:
+                f.write(self._text)
+            os.replace(tmp_path,self.path)
+
+    def _write_loop(self):
+
+        while not self._stop_event.wait(self.interval):
+            self._refresh()
+
+    def _serve_loop(self):
+
+        while not self._stop_event.is_set():
+            try:
+                connection, address = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            with connection:
+                connection.sendall(self._text.encode("utf-8"))
@@ -15,6 +15,7 @@ setup(name='ledsart',
       url='https://github.com/harmsm/led-art-installation',
       download_url='https://XX',
       zip_safe=False,
+      python_requires=">=3.8",
       install_requires=["numpy"],
       classifiers=[])
 
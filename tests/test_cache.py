@@ -0,0 +1,109 @@
+__description__ = \
+"""
+Check that StateCache keys are stable from one run to the next and that
+builds are reproducible.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import os, sys, subprocess
+
+import numpy as np
+import pytest
+
+from ledsart.cache import StateCache
+from ledsart.generators import Life
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KEY_SCRIPT = """
+import numpy as np
+import matplotlib
+from ledsart.cache import StateCache
+from ledsart.generators import Life
+from ledsart.history import with_trails
+
+cache = StateCache({directory!r})
+config = {{"x_size":np.int64(16),
+           "starting_density":np.float64(0.25),
+           "rule":"B36/S23",
+           "weights":np.arange(3),
+           "cmap":matplotlib.colormaps["viridis"]}}
+print(cache.key(with_trails(Life,5),config,100,3))
+"""
+
+class Unstable:
+    pass
+
+def key_in_new_process(directory):
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT,env.get("PYTHONPATH","")])
+    env["PYTHONHASHSEED"] = "random"
+
+    output = subprocess.run([sys.executable,"-c",
+                             KEY_SCRIPT.format(directory=directory)],
+                            env=env,check=True,capture_output=True,text=True)
+
+    return output.stdout.strip()
+
+def test_key_same_across_processes(tmp_path):
+
+    keys = [key_in_new_process(str(tmp_path)) for i in range(2)]
+
+    assert len(keys[0]) == 40
+    assert keys[0] == keys[1]
+
+def test_key_depends_on_inputs(tmp_path):
+
+    cache = StateCache(str(tmp_path))
+    config = {"x_size":16,"rule":"B3/S23"}
+
+    key = cache.key(Life,config,100,0)
+    assert key == cache.key(Life,dict(config),100,0)
+    assert key != cache.key(Life,config,101,0)
+    assert key != cache.key(Life,config,100,1)
+    assert key != cache.key(Life,{"x_size":16,"rule":"B36/S23"},100,0)
+
+@pytest.mark.parametrize("value",[lambda x: x,Unstable(),object()])
+def test_unstable_key_rejected(tmp_path,value):
+
+    cache = StateCache(str(tmp_path))
+    with pytest.raises(ValueError):
+        cache.key(Life,{"rule":value},100,0)
+
+def test_unstable_config_built_not_cached(tmp_path):
+
+    class Counter:
+        def __init__(self,step):
+            self.value = 0
+            self.step = step
+        def iterate(self):
+            self.value = self.step(self.value)
+
+    cache = StateCache(str(tmp_path))
+    iterator = cache.build(Counter,{"step":lambda x: x + 1},5)
+
+    assert iterator.value == 5
+    assert os.listdir(str(tmp_path)) == []
+
+def test_build_reproducible(tmp_path):
+
+    state = np.random.get_state()
+
+    grids = []
+    for name in ("a","b"):
+        cache = StateCache(str(tmp_path/name),num_seeds=1)
+        grids.append(cache.build(Life,{"x_size":16,"y_size":16},10).grid.copy())
+
+    assert np.array_equal(grids[0],grids[1])
+
+    # The second build of the same configuration is loaded from the cache
+    cache = StateCache(str(tmp_path/"a"),num_seeds=1)
+    loaded = cache.build(Life,{"x_size":16,"y_size":16},10)
+    assert np.array_equal(loaded.grid,grids[0])
+    assert loaded.generation == 10
+
+    # Seeded builds leave the global numpy random state alone
+    after = np.random.get_state()
+    assert all(np.array_equal(a,b) for a, b in zip(state,after))
@@ -0,0 +1,139 @@
+__description__ = \
+"""
+Check the seqlock double buffer shared between ledsart and the display daemon.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import threading, uuid
+
+import numpy as np
+import pytest
+
+from ledsart.daemon import SharedFrameBuffer, _HEADER
+
+@pytest.fixture
+def name():
+    """
+    A segment name no other test (or test run) uses.
+    """
+
+    return "ledsart-test-{}".format(uuid.uuid4().hex[:12])
+
+@pytest.fixture
+def writer(name):
+
+    frames = SharedFrameBuffer(name,8,16,create=True)
+    yield frames
+    frames.close()
+
+def test_read_before_write(name,writer):
+
+    reader = SharedFrameBuffer(name)
+    out = np.zeros((8,16,4),dtype=np.uint8)
+
+    assert not reader.read(out)
+    reader.close()
+
+def test_write_then_read(name,writer):
+
+    reader = SharedFrameBuffer(name)
+    out = np.zeros((8,16,4),dtype=np.uint8)
+
+    rng = np.random.RandomState(0)
+    for i in range(3):
+        frame = rng.randint(0,256,(8,16,4)).astype(np.uint8)
+        writer.write(frame)
+
+        assert reader.read(out)
+        assert np.array_equal(out,frame)
+        assert reader.sequence == i + 1
+
+        # Nothing new to read
+        assert not reader.read(out)
+
+    reader.close()
+
+def test_reader_gets_newest_frame(name,writer):
+
+    reader = SharedFrameBuffer(name)
+    out = np.zeros((8,16,4),dtype=np.uint8)
+
+    for i in range(5):
+        writer.write(np.full((8,16,4),i,dtype=np.uint8))
+
+    assert reader.read(out)
+    assert np.all(out == 4)
+    reader.close()
+
+def test_no_torn_frames(name):
+
+    writer = SharedFrameBuffer(name,64,128,create=True)
+    reader = SharedFrameBuffer(name)
+    out = np.zeros((64,128,4),dtype=np.uint8)
+
+    frames = [np.full((64,128,4),i,dtype=np.uint8) for i in range(256)]
+    stop = threading.Event()
+
+    def write_frames():
+        i = 0
+        while not stop.is_set():
+            writer.write(frames[i % 256])
+            i += 1
+
+    thread = threading.Thread(target=write_frames)
+    thread.start()
+
+    try:
+        num_read = 0
+        for i in range(20000):
+            if reader.read(out):
+                num_read += 1
+                assert np.all(out == out[0,0,0])
+    finally:
+        stop.set()
+        thread.join()
+
+    assert num_read > 0
+
+    reader.close()
+    writer.close()
+
+def test_close_and_writer_alive(name):
+
+    writer = SharedFrameBuffer(name,8,16,create=True)
+    reader = SharedFrameBuffer(name)
+
+    assert not reader.closed
+    assert reader.writer_alive
+
+    writer.close()
+    assert reader.closed
+    reader.close()
+
+def test_shape_checked(name,writer):
+
+    with pytest.raises(ValueError):
+        SharedFrameBuffer(name,8,32)
+
+def test_live_segment_not_replaced(name,writer):
+
+    with pytest.raises(FileExistsError):
+        SharedFrameBuffer(name,8,16,create=True)
+
+def test_closed_segment_replaced(name):
+
+    frames = SharedFrameBuffer(name,8,16,create=True)
+    frames.write(np.ones((8,16,4),dtype=np.uint8))
+
+    # Mark the segment closed but leave it behind, then check a new writer
+    # takes it over
+    frames._header[_HEADER.index("closed")] = 1
+    frames._owner = False
+    frames.close()
+
+    replacement = SharedFrameBuffer(name,8,16,create=True)
+    assert replacement.sequence == 0
+    assert not replacement.closed
+    assert replacement.writer_alive
+    replacement.close()
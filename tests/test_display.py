@@ -0,0 +1,166 @@
+__description__ = \
+"""
+Check the precomputed gather map in Display against a per-panel loop.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import numpy as np
+import pytest
+
+import ledsart
+
+def loop_chain(display,image):
+    """
+    Build the chain the original way: slice, rotate and copy each panel.
+    Chain pixels no panel covers are black.
+    """
+
+    chain = np.zeros(display._chain_matrix.shape[:2] + (3,),dtype=np.uint8)
+    for s in display._chain:
+
+        chain_x_0 = s.chain_row*display._band_rows
+        chain_y_0 = s.chain_offset
+        rows, columns = s.chain_shape
+
+        block = image[s.offset[0]:s.offset[0] + s.shape[0],
+                      s.offset[1]:s.offset[1] + s.shape[1],:3]
+        chain[chain_x_0:chain_x_0 + rows,
+              chain_y_0:chain_y_0 + columns] = s.transform(block)
+
+    return chain
+
+def snake(size=8):
+    """
+    2x2 wall with a snaking chain, every other row flipped.
+    """
+
+    A, B, C, D = [ledsart.Panel(size,size) for i in range(4)]
+
+    return [[A,B],[C,D]], [A,B,D,C], [0,0,180,180]
+
+def rotated(size=8):
+    """
+    2x2 wall with all four rotations.
+    """
+
+    A, B, C, D = [ledsart.Panel(size,size) for i in range(4)]
+
+    return [[A,B],[C,D]], [A,B,C,D], [0,90,180,270]
+
+def mixed_sizes():
+    """
+    Square and wide (unrotated) panels in one wall.
+    """
+
+    A, B = ledsart.Panel(8,8), ledsart.Panel(8,16)
+    C, D = ledsart.Panel(8,16), ledsart.Panel(8,8)
+
+    return [[A,B],[C,D]], [A,B,D,C], [0,0,180,180]
+
+def rotated_wide():
+    """
+    A tall panel rotated into a wide chain slot next to a square one.
+    """
+
+    A, B = ledsart.Panel(16,8), ledsart.Panel(8,8)
+
+    return [[A,B]], [A,B], [90,0]
+
+def uneven_heights():
+    """
+    Panels of different heights, leaving uncovered chain rows.
+    """
+
+    A, B = ledsart.Panel(4,8), ledsart.Panel(8,8)
+
+    return [[A],[B]], [A,B], [0,180]
+
+def parallel():
+    """
+    Two parallel chains of two panels.
+    """
+
+    A, B, C, D = [ledsart.Panel(8,8) for i in range(4)]
+
+    return [[A,B],[C,D]], [[A,B],[D,C]], [0,0,180,180]
+
+def parallel_mixed():
+    """
+    Two parallel chains of different widths.
+    """
+
+    A, B = ledsart.Panel(8,16), ledsart.Panel(8,8)
+    C, D = ledsart.Panel(8,8), ledsart.Panel(8,8)
+
+    return [[A,B],[C,D]], [[A,B],[C,D]], [0,0,90,270]
+
+WALLS = [snake,rotated,mixed_sizes,rotated_wide,uneven_heights,parallel,
+         parallel_mixed]
+
+@pytest.mark.parametrize("wall",WALLS)
+@pytest.mark.parametrize("dtype",[np.uint8,np.int64,float])
+def test_gather_matches_loop(wall,dtype):
+
+    layout, chain, rotation = wall()
+    display = ledsart.Display(layout,chain,rotation,backend="null")
+
+    rng = np.random.RandomState(0)
+    image = rng.randint(0,256,display.shape + (4,)).astype(dtype)
+
+    display.draw(image)
+
+    assert np.array_equal(display._chain_matrix[:,:,:3],loop_chain(display,image))
+
+@pytest.mark.parametrize("wall",WALLS)
+def test_changed_panels_are_redrawn(wall):
+
+    layout, chain, rotation = wall()
+    display = ledsart.Display(layout,chain,rotation,backend="null")
+
+    rng = np.random.RandomState(1)
+    image = rng.randint(0,256,display.shape + (4,)).astype(np.uint8)
+    display.draw(image)
+
+    # Redrawing the same image is skipped
+    display.draw(image)
+    assert display.frames_skipped == 1
+
+    # Change only the last panel in the chain
+    panel = display._chain[-1]
+    image[panel.offset[0]:panel.offset[0] + panel.shape[0],
+          panel.offset[1]:panel.offset[1] + panel.shape[1]] = 7
+    display.draw(image)
+
+    assert np.array_equal(display._chain_matrix[:,:,:3],loop_chain(display,image))
+
+def test_uncovered_pixels_stay_black():
+
+    layout, chain, rotation = uneven_heights()
+    layout[0][0].calibration = np.full((3,256),100)
+    display = ledsart.Display(layout,chain,rotation,backend="null")
+
+    display.draw(np.full(display.shape + (3,),255,dtype=np.uint8))
+
+    assert display._uncovered is not None
+    assert np.all(display._chain_matrix[display._uncovered] == 0)
+
+def test_display_group_matches_loop():
+
+    walls = [ledsart.Display(*snake(),backend="null"),
+             ledsart.Display(*mixed_sizes(),backend="null")]
+    group = ledsart.DisplayGroup(walls,offsets=[(0,0),(16,0)])
+
+    rng = np.random.RandomState(2)
+    image = rng.randint(0,256,group.shape + (4,)).astype(np.uint8)
+    group.draw(image)
+
+    for wall, (x, y) in zip(walls,[(0,0),(16,0)]):
+        region = image[x:x + wall.shape[0],y:y + wall.shape[1]]
+        assert np.array_equal(wall._chain_matrix[:,:,:3],loop_chain(wall,region))
+
+def test_rgbmatrix_rejected_per_chain():
+
+    layout, chain, rotation = parallel()
+    with pytest.raises(ValueError):
+        ledsart.Display(layout,chain,rotation,backend=["null","rgbmatrix"])
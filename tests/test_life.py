@@ -0,0 +1,92 @@
+__description__ = \
+"""
+Check Life against a plain np.roll implementation of a life-like automaton.
+"""
+__author__ = "Michael J. Harms"
+__date__ = "2017-01-01"
+
+import pickle
+
+import numpy as np
+import pytest
+
+from ledsart.generators import Life, parse_rule
+
+def reference_step(grid,rule):
+    """
+    One step on a toroidal grid, counting neighbors with np.roll.
+    """
+
+    table = parse_rule(rule)
+
+    neighbors = np.zeros(grid.shape,dtype=int)
+    for dx in (-1,0,1):
+        for dy in (-1,0,1):
+            if dx == 0 and dy == 0:
+                continue
+            neighbors += np.roll(np.roll(grid,dx,axis=0),dy,axis=1)
+
+    return table[grid,neighbors]
+
+@pytest.mark.parametrize("rule",["B3/S23","B36/S23","B2/S","B1357/S1357"])
+@pytest.mark.parametrize("shape",[(32,32),(17,40),(1,9),(3,3)])
+def test_matches_reference(rule,shape):
+
+    life = Life(shape[0],shape[1],starting_density=0.4,rule=rule,seed=0)
+    grid = life.grid.copy()
+
+    for i in range(20):
+        life.iterate()
+        grid = reference_step(grid,rule)
+        assert np.array_equal(life.grid,grid)
+
+    assert life.generation == 20
+
+def test_glider_wraps():
+
+    life = Life(8,8,starting_density=0)
+    life.grid[0:3,0:3] = [[0,1,0],
+                          [0,0,1],
+                          [1,1,1]]
+    start = life.grid.copy()
+
+    # A glider moves one cell diagonally every four steps
+    life.iterate(32)
+
+    assert np.array_equal(life.grid,start)
+
+def test_iterate_many_equals_single_steps():
+
+    one_call = Life(24,24,seed=3)
+    single_steps = Life(24,24,seed=3)
+
+    one_call.iterate(25)
+    for i in range(25):
+        single_steps.iterate()
+
+    assert np.array_equal(one_call.grid,single_steps.grid)
+    assert np.array_equal(one_call.as_values(),single_steps.as_values())
+
+def test_seed():
+
+    assert np.array_equal(Life(16,16,seed=5).grid,Life(16,16,seed=5).grid)
+    assert not np.array_equal(Life(16,16,seed=5).grid,Life(16,16,seed=6).grid)
+
+def test_pickle_round_trip():
+
+    life = Life(20,30,seed=1)
+    life.iterate(10)
+
+    copy = pickle.loads(pickle.dumps(life))
+    assert np.array_equal(copy.grid,life.grid)
+
+    # The unpickled grid must still be the view the steps update
+    life.iterate(5)
+    copy.iterate(5)
+    assert np.array_equal(copy.grid,life.grid)
+    assert copy.generation == 15
+
+def test_bad_rule():
+
+    with pytest.raises(ValueError):
+        Life(rule="Conway")